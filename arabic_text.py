@@ -0,0 +1,194 @@
+import unicodedata
+from functools import lru_cache
+
+import arabic_reshaper
+from bidi.algorithm import get_base_level, get_display
+
+ARABIC_INDIC_DIGITS = '٠١٢٣٤٥٦٧٨٩'
+
+# Translation tables, built once
+BIDI_MARKS = {ord('‎'): None, ord('‏'): None}  # LRM, RLM
+# Tatweel and harakat: rendering details, not letters
+TASHKEEL = {ord('ـ'): None, **{code: None for code in range(0x064B, 0x0653)}}
+TO_ARABIC_INDIC_DIGITS = str.maketrans('0123456789', ARABIC_INDIC_DIGITS)
+TO_LATIN_DIGITS = str.maketrans(ARABIC_INDIC_DIGITS, '0123456789')
+
+
+def _presentation_forms_table():
+    """Arabic presentation forms (what reshaping produces) -> the letters they stand for"""
+    table = {}
+    for code in list(range(0xFB50, 0xFE00)) + list(range(0xFE70, 0xFF00)):
+        decomposition = unicodedata.decomposition(chr(code))
+        tag, _, codes = decomposition.partition(' ')
+        if tag in ('<isolated>', '<final>', '<initial>', '<medial>'):
+            table[code] = ''.join(chr(int(c, 16)) for c in codes.split())
+    return table
+
+
+FOLD_PRESENTATION_FORMS = _presentation_forms_table()
+
+
+@lru_cache(maxsize=None)
+def normalization_table(marks=True, tashkeel=False, digits=None, fold_forms=False):
+    """
+    One translation table doing all the requested normalizations, so text
+    is walked once: strip LRM/RLM (``marks``), tatweel/harakat
+    (``tashkeel``), fold presentation forms back to letters (``fold_forms``)
+    and convert digits to "latin" or "arabic-indic" (``digits``).
+    """
+    table = {}
+    if fold_forms:
+        table.update(FOLD_PRESENTATION_FORMS)
+    if digits == 'latin':
+        table.update(TO_LATIN_DIGITS)
+    elif digits == 'arabic-indic':
+        table.update(TO_ARABIC_INDIC_DIGITS)
+    elif digits is not None:
+        raise ValueError(f"Unknown digits: {digits}")
+    if tashkeel:
+        table.update(TASHKEEL)
+    if marks:
+        table.update(BIDI_MARKS)
+    return table
+
+
+def normalize(text, marks=True, tashkeel=False, digits=None, fold_forms=False):
+    return text.translate(normalization_table(marks, tashkeel, digits, fold_forms))
+
+
+# --- Display (reshape + bidi) line by line ---------------------------------
+#
+# get_display runs the bidi algorithm over the whole page as one paragraph,
+# so a line's layout can depend on the text around it: through the last
+# strong letter before it (rules W2/W7), the last number or letter before
+# it and the first one after it (neutrals, N1). A line laid out once is
+# therefore cached under (line, paragraph direction, that context), which
+# gives exactly what get_display would give for it on any other page. New
+# lines are laid out between stand-in characters recreating that context,
+# or, when a page has many of them, by one get_display call over the page
+# (cheaper than one call per line). Texts using explicit embeddings or
+# isolates always go through get_display whole.
+
+_LINE_TYPES = frozenset(('L', 'R', 'AL', 'EN', 'AN', 'ES', 'ET', 'CS', 'NSM', 'B', 'S', 'WS', 'ON', 'BN'))
+_STRONG = frozenset(('L', 'R', 'AL'))
+_NUMBERS = frozenset(('EN', 'AN'))
+# Stand-ins with the bidi class of the context they recreate
+_STAND_IN = {'L': 'a', 'R': 'א', 'AL': 'ب', 'EN': '5', 'AN': '٥'}
+CACHE_SIZE = 65536  # lines, per cache
+_reshape_cache = {}
+_display_cache = {}
+
+
+def _cache_lines(cache, keys, values):
+    if len(cache) + len(keys) > CACHE_SIZE:
+        cache.clear()
+    cache.update(zip(keys, values))
+
+
+def reshape_lines(lines):
+    """
+    arabic_reshaper.reshape of each line. Shaping never joins across a line
+    break, so cached lines are reused as they are; a page with new lines is
+    reshaped in one call (each call re-reads the reshaper's configuration).
+    """
+    lines = list(lines)
+    if all(line in _reshape_cache for line in lines):
+        return [_reshape_cache[line] for line in lines]
+    reshaped = arabic_reshaper.reshape('\n'.join(lines)).split('\n')
+    _cache_lines(_reshape_cache, lines, reshaped)
+    return reshaped
+
+
+@lru_cache(maxsize=65536)
+def _line_classes(line):
+    """
+    (first, last_strong, last_number, cacheable) for a reshaped line: the
+    bidi class of its first letter or number, of its last letter, of its
+    last number when no letter follows it, and whether the line can be
+    laid out with this context alone.
+    """
+    first = strong = number = None
+    prev_type = 'B'  # a line always follows a paragraph separator
+    for char in line:
+        bidi_type = unicodedata.bidirectional(char)
+        if bidi_type not in _LINE_TYPES:
+            return None, None, None, False
+        if bidi_type == 'BN':
+            continue  # dropped by the algorithm before anything else (X9)
+        if bidi_type == 'NSM':
+            bidi_type = prev_type  # W1
+        if bidi_type in _STRONG:
+            strong, number = bidi_type, None
+        elif bidi_type in _NUMBERS:
+            number = bidi_type
+        if first is None and (bidi_type in _STRONG or bidi_type in _NUMBERS):
+            first = bidi_type
+        prev_type = bidi_type
+    return first, strong, number, True
+
+
+def _display_keys(lines, base_dir):
+    """Cache key of every line, None for the whole page when it cannot be cached"""
+    classes = [_line_classes(line) for line in lines]
+    if not all(cacheable for *_, cacheable in classes):
+        return None
+    # First letter or number after each line, looking past blank lines
+    following = [None] * len(lines)
+    for k in range(len(lines) - 2, -1, -1):
+        following[k] = classes[k + 1][0] or following[k + 1]
+
+    keys = []
+    strong = number = None
+    for line, (_, line_strong, line_number, _), after in zip(lines, classes, following):
+        keys.append((line, base_dir, strong, number, after))
+        if line_strong:
+            strong, number = line_strong, line_number
+        elif line_number:
+            number = line_number
+    return keys
+
+
+def _display_line(key):
+    """get_display of a single line, between stand-ins for the rest of its page"""
+    line, base_dir, strong, number, following = key
+    before = (_STAND_IN[strong] if strong else '') + (_STAND_IN[number] if number else '')
+    after = '\n' + _STAND_IN[following] if following else ''
+    if not before:
+        return get_display(line + after, base_dir=base_dir).split('\n')[0]
+    return get_display(before + '\n' + line + after, base_dir=base_dir).split('\n')[1]
+
+
+def iter_display_lines(lines):
+    """
+    Lay out reshaped ``lines`` (one page, in order) for display, yielding
+    them one at a time: the lines get_display gives for the whole page.
+    """
+    lines = list(lines)
+    reshaped = '\n'.join(lines)
+    base_dir = ('L', 'R')[get_base_level(reshaped)] if reshaped else 'L'
+    keys = _display_keys(lines, base_dir)
+    if keys is not None:
+        # One lookup per line: other threads may clear the cache meanwhile
+        displayed = [_display_cache.get(key) for key in keys]
+        misses = [key for key, line in zip(keys, displayed) if line is None]
+        # A few new lines are laid out alone, many at once with the page
+        if len(misses) * 4 <= len(keys):
+            new = {key: _display_line(key) for key in misses}
+            _cache_lines(_display_cache, new, new.values())
+            for key, line in zip(keys, displayed):
+                yield new[key] if line is None else line
+            return
+
+    displayed = get_display(reshaped).split('\n')
+    if keys is not None:
+        _cache_lines(_display_cache, keys, displayed)
+    yield from displayed
+
+
+def to_display(text):
+    """
+    arabic_reshaper.reshape + get_display, with identical output, but done
+    line by line with caching so lines that recur (headings, running
+    headers, pages OCRed again) are reshaped and laid out once.
+    """
+    return '\n'.join(iter_display_lines(reshape_lines(text.split('\n'))))
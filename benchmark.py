@@ -0,0 +1,171 @@
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from arabic_text import to_display
+from ocr import ArabicPDFOCR
+from metrics import Metrics
+from quality import character_error_rate
+
+def parse_pages(spec):
+    """'10-29,40' -> [9, ..., 28, 39] (0-based page indices)"""
+    pages = []
+    for part in spec.split(","):
+        start, _, stop = part.partition("-")
+        pages.extend(range(int(start) - 1, int(stop or start)))
+    return pages
+
+
+def load_reference(path):
+    """Read a transcript made of '--- Page N ---' sections into {page_number: text}"""
+    reference = {}
+    page = None
+    for line in Path(path).read_text(encoding="utf-8").splitlines():
+        if line.startswith("--- Page ") and line.endswith(" ---"):
+            page = int(line[len("--- Page "):-len(" ---")])
+            reference[page] = []
+        elif page is not None:
+            reference[page].append(line)
+    return {page: "\n".join(lines).strip() for page, lines in reference.items()}
+
+
+def percentiles(samples):
+    values = np.array(samples, dtype=float)
+    return {
+        "count": len(samples),
+        "total": float(values.sum()),
+        "mean": float(values.mean()),
+        "p50": float(np.percentile(values, 50)),
+        "p90": float(np.percentile(values, 90)),
+        "p99": float(np.percentile(values, 99)),
+        "max": float(values.max()),
+    }
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process and of its children (tesseract), in MB"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None, None
+    per_mb = 1024 * 1024 if sys.platform == "darwin" else 1024  # ru_maxrss: bytes on macOS, kB on Linux
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / per_mb
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / per_mb
+    return own, children
+
+
+def git_version():
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            capture_output=True, text=True, check=True, cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(pdf_path, pages, engine="tesseract", dpi=200, reference=None, workers=1):
+    """
+    Run ``pages`` through iter_ocr_pdf (render -> preprocess -> OCR -> reshape/bidi) and time every stage.
+
+    Stage timings come from the Metrics records the run emits to its sink,
+    pool workers included. The character error rate of the pages present in
+    ``reference`` compares the text as ocr_pdf outputs it with the reference
+    put through the same reshaping/bidi (normalize_for_cer folds the
+    presentation forms back).
+    """
+    records = []
+    ocr = ArabicPDFOCR(use_easyocr=(engine == "easyocr"), cascade=(engine == "cascade"),
+                       metrics=Metrics(records.append))
+    reference = reference or {}
+    cer = {}
+
+    start = time.perf_counter()
+    # Settled here to time it on its own: iter_ocr_pdf keeps a crop it is given
+    preprocess = ocr.with_document_crop(pdf_path, pages=pages) if ocr.auto_crop else True
+    margins_seconds = time.perf_counter() - start
+
+    n = 0
+    for page_number, text in ocr.iter_ocr_pdf(pdf_path, preprocess=preprocess, dpi=dpi, pages=pages,
+                                              workers=workers):
+        n += 1
+        if page_number in reference:
+            cer[page_number] = character_error_rate(text, to_display(reference[page_number]))
+    wall = time.perf_counter() - start
+
+    timings = {}
+    for record in records:
+        if record["type"] != "page":
+            continue
+        for stage, seconds in record["stages"].items():
+            timings.setdefault(stage, []).append(seconds)
+    own_rss, children_rss = peak_rss_mb()
+    return {
+        "version": git_version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "config": {"pdf": str(pdf_path), "engine": engine, "dpi": dpi, "pages": [p + 1 for p in pages],
+                   "workers": workers},
+        "pages": n,
+        "wall_seconds": wall,
+        "pages_per_second": n / wall if wall else None,
+        "document_seconds": {"detect_margins": margins_seconds},
+        "stages": {stage: percentiles(samples) for stage, samples in timings.items()},
+        "peak_rss_mb": own_rss,
+        "peak_rss_children_mb": children_rss,
+        "cer": {
+            "pages": cer,
+            "mean": sum(cer.values()) / len(cer) if cer else None,
+        },
+    }
+
+
+def compare(results, baseline):
+    """Print how results moved against an earlier benchmark JSON"""
+    def change(new, old):
+        if new is None or old is None or not old:
+            return "n/a"
+        return f"{(new - old) / old:+.1%}"
+
+    print(f"pages/sec: {results['pages_per_second']:.3f} ({change(results['pages_per_second'], baseline.get('pages_per_second'))})")
+    print(f"CER: {results['cer']['mean']} ({change(results['cer']['mean'], baseline.get('cer', {}).get('mean'))})")
+    print(f"peak RSS: {results['peak_rss_mb']} MB ({change(results['peak_rss_mb'], baseline.get('peak_rss_mb'))})")
+    for stage, stats in results["stages"].items():
+        old = baseline.get("stages", {}).get(stage, {}).get("p50")
+        print(f"{stage} p50: {stats['p50'] * 1000:.1f} ms ({change(stats['p50'], old)})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput and accuracy benchmark on COCArabe.pdf")
+    parser.add_argument("--pdf", default="COCArabe.pdf")
+    parser.add_argument("--pages", default="10-29", help="1-based pages, e.g. '10-29,40'")
+    parser.add_argument("--engine", choices=("tesseract", "easyocr", "cascade"), default="tesseract")
+    parser.add_argument("--dpi", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=1, help="OCR processes, as in ocr_pdf")
+    parser.add_argument("--reference", default="benchmark_reference.txt")
+    parser.add_argument("--output", help="write the results as JSON to this file (e.g. benchmark_results.json)")
+    parser.add_argument("--baseline", help="earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    reference = load_reference(args.reference) if Path(args.reference).exists() else {}
+    results = run_benchmark(args.pdf, parse_pages(args.pages), args.engine, args.dpi, reference, args.workers)
+
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+        print(f"Benchmark results saved to {args.output}")
+    else:
+        print(output)
+    if args.baseline:
+        compare(results, json.loads(Path(args.baseline).read_text(encoding="utf-8")))
+
+
+if __name__ == "__main__":
+    main()
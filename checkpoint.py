@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+
+class PageHasher:
+    """
+    Fingerprint the input of each page, to tell on resume whether a page
+    already written still comes from the same document.
+
+    PDF pages hash their content stream plus the raw streams of the images
+    they draw; pages of an image folder hash the image file.
+    """
+
+    def __init__(self, source, image_files=None):
+        self.source = Path(source)
+        self.image_files = image_files
+        self._doc = None
+
+    def __call__(self, index):
+        h = hashlib.sha256()
+        if self.image_files is not None:
+            h.update(Path(self.image_files[index]).read_bytes())
+            return h.hexdigest()
+        if self._doc is None:
+            import fitz  # PyMuPDF
+            self._doc = fitz.open(self.source)
+        page = self._doc.load_page(index)
+        h.update(f"{tuple(page.rect)}|{page.rotation}".encode("utf-8"))
+        h.update(page.read_contents())
+        for image in page.get_images(full=True):
+            h.update(self._doc.xref_stream_raw(image[0]) or b"")
+        return h.hexdigest()
+
+    def close(self):
+        if self._doc is not None:
+            self._doc.close()
+            self._doc = None
+
+
+def manifest_config(output_file):
+    """Config recorded by the CheckpointedOutput of ``output_file``, or None"""
+    manifest_file = Path(output_file).with_name(Path(output_file).name + ".manifest.jsonl")
+    try:
+        with open(manifest_file, encoding="utf-8") as f:
+            return json.loads(f.readline()).get("config")
+    except (OSError, json.JSONDecodeError, AttributeError):
+        return None
+
+
+class CheckpointedOutput:
+    """
+    Append OCR output to a file page by page, with a manifest that lets an
+    interrupted run pick up where it stopped.
+
+    The manifest (``<output_file>.manifest.jsonl``) starts with the run's
+    config, then holds one line per written page: page index, input hash,
+    status ("done", or "empty" for pages without text, which are left out
+    of the output) and the byte offset/length of the page in the output.
+    Text is flushed in page order: pages finishing early wait in a reorder
+    buffer until the pages before them are written.
+
+    On resume the manifest is replayed in page order and stops at the first
+    page that is missing, comes from a changed input, or does not match the
+    output file; the output is truncated there and that page is where OCR
+    restarts. A different config starts the output over.
+    """
+
+    def __init__(self, output_file, page_indices, hasher, config, resume=True):
+        self.output_file = Path(output_file)
+        self.manifest_file = self.output_file.with_name(self.output_file.name + ".manifest.jsonl")
+        self.hasher = hasher
+        self.config = config
+        self.page_indices = list(page_indices)
+
+        entries = self._load() if resume else []
+        if entries:
+            print(f"Resuming {self.output_file}: {len(entries)} page(s) already done")
+        self.remaining = self.page_indices[len(entries):]
+        self.offset = entries[-1]["offset"] + entries[-1]["length"] if entries else 0
+
+        # Keep exactly the verified prefix, in the output and in the manifest
+        mode = "r+b" if self.output_file.exists() else "wb"
+        self._output = open(self.output_file, mode)
+        self._output.truncate(self.offset)
+        self._output.seek(self.offset)
+        tmp = self.manifest_file.with_name(self.manifest_file.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            for line in [{"config": config}] + entries:
+                f.write(json.dumps(line, ensure_ascii=False) + "\n")
+        os.replace(tmp, self.manifest_file)
+        self._manifest = open(self.manifest_file, "a", encoding="utf-8")
+
+        self._next = 0  # position in self.remaining of the next page to write
+        self._buffer = {}
+
+    def _load(self):
+        """Manifest entries still valid for this run, in page order"""
+        if not self.manifest_file.exists() or not self.output_file.exists():
+            return []
+        lines = []
+        with open(self.manifest_file, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    lines.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break  # torn last line from a crash
+        if not lines or lines[0].get("config") != self.config:
+            print(f"{self.manifest_file} is from a different run, starting over")
+            return []
+
+        by_page = {entry["page"]: entry for entry in lines[1:]}
+        size = self.output_file.stat().st_size
+        valid = []
+        offset = 0
+        for index in self.page_indices:
+            entry = by_page.get(index)
+            if (entry is None or entry["offset"] != offset
+                    or offset + entry["length"] > size or entry["hash"] != self.hasher(index)):
+                break
+            valid.append(entry)
+            offset += entry["length"]
+        return valid
+
+    def add(self, index, text):
+        """Take a finished page (in any order) and write out every page that is now in order"""
+        self._buffer[index] = text
+        while self._next < len(self.remaining) and self.remaining[self._next] in self._buffer:
+            page = self.remaining[self._next]
+            self._write(page, self._buffer.pop(page))
+            self._next += 1
+
+    def _write(self, index, text):
+        chunk = b""
+        if text.strip():
+            # Same layout as ocr_pdf's in-memory output: blank line between pages
+            separator = "\n" if self.offset else ""
+            chunk = f"{separator}--- Page {index + 1} ---\n{text}\n".encode("utf-8")
+            self._output.write(chunk)
+            self._output.flush()
+            os.fsync(self._output.fileno())
+        entry = {
+            "page": index,
+            "hash": self.hasher(index),
+            "status": "done" if chunk else "empty",
+            "offset": self.offset,
+            "length": len(chunk),
+        }
+        self._manifest.write(json.dumps(entry) + "\n")
+        self._manifest.flush()
+        os.fsync(self._manifest.fileno())
+        self.offset += len(chunk)
+
+    @property
+    def complete(self):
+        return self._next == len(self.remaining)
+
+    def close(self):
+        self._output.close()
+        self._manifest.close()
+        self.hasher.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
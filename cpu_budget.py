@@ -0,0 +1,118 @@
+import os
+import sys
+
+import cv2
+
+
+def available_cores():
+    """CPUs this process may run on (its affinity mask, not the whole machine)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # macOS, Windows
+        return os.cpu_count() or 1
+
+
+def limit_threads(threads, torch_threads=None):
+    """
+    Cap the thread pools the OCR libraries start in this process at
+    ``threads``, torch's at ``torch_threads`` when given.
+
+    OpenMP (Tesseract, and torch's CPU kernels) reads its limits from the
+    environment when it starts: every pytesseract call is a new tesseract
+    process and picks up a new value, while a TesseractPool or torch keep the
+    one they started with. OpenCV and an already imported torch are set
+    directly.
+    """
+    os.environ["OMP_THREAD_LIMIT"] = str(threads)
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    cv2.setNumThreads(threads)
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(torch_threads or threads)
+
+
+class StageScheduler:
+    """
+    CPU budget of a parallel ocr_pdf run: the parent renders pages while
+    ``workers`` processes preprocess and OCR them, on ``cores`` CPUs.
+
+    Left alone, Tesseract, OpenCV and torch each start a thread per core in
+    every worker, and the workers fight over the CPU. The scheduler keeps
+    moving averages of what a page costs, the parent's render time and a
+    worker's page time (preprocessing and OCR), and derives from them:
+
+    - where pages are rendered: when the parent can't render pages as fast
+      as the workers take them (workers * render > page), it hands over a
+      share of the pages for the workers to render themselves, the share
+      that makes the parent and the workers finish together;
+    - how many threads each worker's libraries get: the cores the parent
+      leaves free (it only renders part of the time), split among the
+      workers, at least one.
+
+    Both are revised after every page, so the split follows the document
+    (pages heavy to render, pages heavy to OCR). Until the first page is
+    measured the parent renders everything and keeps a core to itself.
+    """
+
+    def __init__(self, workers, cores=None, smoothing=0.3):
+        self.workers = workers
+        self.cores = cores or available_cores()
+        self.smoothing = smoothing
+        self.render_seconds = None
+        self.page_seconds = None
+        self._credit = 0.0
+
+    def _average(self, current, seconds):
+        if current is None:
+            return seconds
+        return current + self.smoothing * (seconds - current)
+
+    def observe_render(self, seconds):
+        """Time it took to render a page, wherever that happened"""
+        self.render_seconds = self._average(self.render_seconds, seconds)
+
+    def observe_page(self, record):
+        """A page record from a worker (see metrics.Metrics.page): preprocessing and OCR time"""
+        self.page_seconds = self._average(self.page_seconds, record["seconds"])
+
+    @property
+    def measured(self):
+        return self.render_seconds is not None and self.page_seconds is not None
+
+    def offload_share(self):
+        """
+        Fraction of pages the workers should render: with render cost r and
+        page cost p, the parent spends (1 - f) r per page and the workers
+        (f r + p) / workers; f balances the two, 0 when the parent keeps up.
+        """
+        if not self.measured or not self.render_seconds:
+            return 0.0
+        r, p, w = self.render_seconds, self.page_seconds, self.workers
+        return min(1.0, max(0.0, (w * r - p) / (r * (w + 1))))
+
+    def offload(self):
+        """Should the next page be rendered by a worker? Spreads offload_share evenly over the pages"""
+        self._credit += self.offload_share()
+        if self._credit >= 1.0:
+            self._credit -= 1.0
+            return True
+        return False
+
+    def parent_share(self):
+        """Cores the parent keeps busy rendering (0-1)"""
+        if not self.measured:
+            return 1.0
+        f = self.offload_share()
+        r, p, w = self.render_seconds, self.page_seconds, self.workers
+        worker_time = (f * r + p) / w
+        if not worker_time:
+            return 1.0
+        return min(1.0, (1 - f) * r / worker_time)
+
+    def threads(self):
+        """Library threads for each worker"""
+        return max(1, int((self.cores - self.parent_share()) // self.workers))
+
+    def describe(self):
+        return (f"{self.cores} core(s): {self.workers} worker(s) x {self.threads()} thread(s), "
+                f"{self.offload_share():.0%} of pages rendered by the workers")
@@ -0,0 +1,64 @@
+import math
+
+from bidi.algorithm import get_display
+from easyocr.recognition import get_text
+from easyocr.utils import get_image_list, reformat_input
+
+# Height EasyOCR resizes every text crop to before recognition
+MODEL_HEIGHT = 64
+
+
+def detect_regions(reader, image, page=0):
+    """
+    Run the EasyOCR detector on one page and cut out its text regions.
+
+    Returns a list of regions, each a dict with the page number, the region's
+    position on that page (``order``, the order readtext would return it in)
+    and the crop resized for the recognizer. Region boxes are in page
+    coordinates.
+    """
+    img, img_cv_grey = reformat_input(image)
+    # Same detector settings as Reader.readtext
+    horizontal_list, free_list = reader.detect(img, reformat=False)
+    horizontal_list, free_list = horizontal_list[0], free_list[0]
+
+    regions = []
+    boxes = [([box], []) for box in horizontal_list] + [([], [box]) for box in free_list]
+    for h_list, f_list in boxes:
+        image_list, _ = get_image_list(h_list, f_list, img_cv_grey, model_height=MODEL_HEIGHT)
+        for box, crop in image_list:
+            regions.append({"page": page, "order": len(regions), "box": box, "crop": crop})
+    return regions
+
+
+def recognize_regions(reader, regions, batch_size=16):
+    """
+    Recognize text regions, possibly from many pages, in fixed-size batches.
+
+    Reader.recognize handles one box per call on CPU; here crops of similar
+    width are grouped so each recognizer call runs ``batch_size`` of them with
+    little padding. Returns (page, bbox, text, confidence) tuples in page
+    order, then in the order readtext would have produced for that page.
+    """
+    if not regions:
+        return []
+    ignore_char = "".join(set(reader.character) - set(reader.lang_char))
+
+    by_width = sorted(regions, key=lambda region: region["crop"].shape[1])
+    results = []
+    for start in range(0, len(by_width), batch_size):
+        batch = by_width[start:start + batch_size]
+        max_ratio = max([1] + [region["crop"].shape[1] / MODEL_HEIGHT for region in batch])
+        image_list = [(region["box"], region["crop"]) for region in batch]
+        recognized = get_text(
+            reader.character, MODEL_HEIGHT, int(math.ceil(max_ratio) * MODEL_HEIGHT),
+            reader.recognizer, reader.converter, image_list,
+            ignore_char, 'greedy', 5, len(batch), 0.1, 0.5, 0.003, 0, reader.device,
+        )
+        for region, (box, text, confidence) in zip(batch, recognized):
+            if reader.model_lang == 'arabic':
+                text = get_display(text)  # as Reader.recognize does for Arabic
+            results.append((region["page"], region["order"], box, text, confidence))
+
+    results.sort(key=lambda item: (item[0], item[1]))
+    return [(page, box, text, confidence) for page, _, box, text, confidence in results]
@@ -0,0 +1,111 @@
+import fitz  # PyMuPDF
+
+from main import extract_text_layer
+from ocr import ArabicPDFOCR
+
+
+def count_garbage(text):
+    """Count characters that betray a broken text layer"""
+    garbage = 0
+    for char in text:
+        code = ord(char)
+        if char == "?" or char == "�":  # unknown glyph token / replacement char
+            garbage += 1
+        elif code < 0x20 and char not in "\t\n\r":  # raw font codes
+            garbage += 1
+        elif 0xE000 <= code <= 0xF8FF:  # private use area
+            garbage += 1
+    return garbage
+
+
+class HybridPDFExtractor:
+    """
+    Use a page's text layer when it is usable and OCR only the pages that need it.
+
+    Every page's text layer is first read with main.extract_text_layer.
+    A page goes to ArabicPDFOCR when its text layer is missing (too few letters
+    on a page that carries images) or garbled (too many unknown glyphs/control
+    characters). The decision is recorded for each page.
+    """
+
+    def __init__(self, ocr=None, min_chars=20, max_garbage_ratio=0.05):
+        self.ocr = ocr
+        self.min_chars = min_chars
+        self.max_garbage_ratio = max_garbage_ratio
+
+    def classify_page(self, text, has_images):
+        """Return (use_text_layer, reason) for one page"""
+        stripped = "".join(text.split())
+        letters = sum(1 for char in stripped if char.isalpha())
+        if stripped and count_garbage(stripped) / len(stripped) > self.max_garbage_ratio:
+            return False, "garbled text layer"
+        if letters < self.min_chars:
+            if has_images:
+                return False, "no text layer"
+            # Nothing rendered as an image, so OCR could not find more text
+            return True, "no images, text layer only"
+        return True, "text layer"
+
+    def analyze(self, pdf_path, workers=1):
+        """Read and classify the text layer of every page (``workers`` processes)"""
+        records = []
+        texts = extract_text_layer(pdf_path, workers=workers)
+        doc = fitz.open(pdf_path)
+        try:
+            for i, text in enumerate(texts):
+                has_images = bool(doc.load_page(i).get_images())
+                use_text, reason = self.classify_page(text, has_images)
+                records.append({
+                    "page": i + 1,
+                    "source": "text" if use_text else "ocr",
+                    "reason": reason,
+                    "text": text if use_text else None,
+                })
+        finally:
+            doc.close()
+        return records
+
+    def iter_pages(self, pdf_path, dpi=200, workers=1):
+        """
+        Yield one record per page, in page order:
+        {"page", "source" ("text" or "ocr"), "reason", "text"}
+        """
+        records = self.analyze(pdf_path, workers=workers)
+        ocr_pages = [r["page"] - 1 for r in records if r["source"] == "ocr"]
+        ocr_results = iter(())
+        if ocr_pages:
+            if self.ocr is None:
+                self.ocr = ArabicPDFOCR(use_easyocr=False)
+            ocr_results = self.ocr.iter_ocr_pdf(pdf_path, dpi=dpi, pages=ocr_pages, workers=workers)
+
+        for record in records:
+            if record["source"] == "ocr":
+                _, record["text"] = next(ocr_results)
+            yield record
+
+    def extract(self, pdf_path, output_file=None, dpi=200, workers=1):
+        """Return (text, records) for the whole PDF, like ArabicPDFOCR.ocr_pdf"""
+        all_text = []
+        records = []
+        for record in self.iter_pages(pdf_path, dpi=dpi, workers=workers):
+            print(f"Page {record['page']}: {record['source']} ({record['reason']})")
+            records.append(record)
+            if record["text"].strip():
+                all_text.append(f"--- Page {record['page']} ---")
+                all_text.append(record["text"])
+                all_text.append("")
+
+        final_text = "\n".join(all_text)
+        ocr_count = sum(1 for r in records if r["source"] == "ocr")
+        print(f"{len(records) - ocr_count} page(s) from the text layer, {ocr_count} OCR'd")
+
+        if output_file:
+            with open(output_file, "w", encoding="utf-8") as f:
+                f.write(final_text)
+            print(f"Results saved to {output_file}")
+
+        return final_text, records
+
+
+if __name__ == "__main__":
+    HybridPDFExtractor().extract("COCArabe.pdf", output_file="hybrid_output.txt")
@@ -0,0 +1,169 @@
+import hashlib
+
+import cv2
+import numpy as np
+
+
+def _runs(mask):
+    """(start, stop) pairs of consecutive True values in a 1-D boolean array"""
+    padded = np.concatenate(([False], mask, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    return list(zip(edges[::2], edges[1::2]))
+
+
+def _merge_runs(runs, max_gap):
+    merged = []
+    for start, stop in runs:
+        if merged and start - merged[-1][1] <= max_gap:
+            merged[-1] = (merged[-1][0], stop)
+        else:
+            merged.append((start, stop))
+    return merged
+
+
+def find_text_lines(ink, min_ink=None):
+    """
+    Find text lines with a horizontal projection profile.
+
+    ``ink`` is a boolean array (True = text pixel). Returns (top, bottom) row
+    ranges; runs closer than a third of the median line height (dots,
+    diacritics) are merged into the line they belong to.
+    """
+    if min_ink is None:
+        min_ink = max(1, int(ink.shape[1] * 0.002))
+    rows = _runs(ink.sum(axis=1) >= min_ink)
+    if not rows:
+        return []
+    line_height = float(np.median([stop - start for start, stop in rows]))
+    return _merge_runs(rows, max(1, int(line_height / 3)))
+
+
+def _split_columns(ink, min_gap):
+    """Split a block at vertical whitespace wider than min_gap; (left, right) ranges"""
+    columns = _runs(ink.any(axis=0))
+    return _merge_runs(columns, min_gap)
+
+
+def find_text_blocks(image, ink_threshold=128, rtl=True):
+    """
+    Locate text blocks on a binarized page (dark text on a light background).
+
+    Lines are grouped into blocks at blank bands taller than 1.5 times the
+    usual gap between lines (paragraph breaks, headings), and blocks are
+    split into columns at wide vertical gaps. Blocks come back in reading
+    order: top to bottom, and columns right to left for Arabic (``rtl``). Each block is (x0, y0, x1, y1), padded a little and
+    clipped to the page.
+    """
+    ink = np.asarray(image) < ink_threshold
+    if ink.ndim == 3:
+        ink = ink.any(axis=2)
+    height, width = ink.shape
+    lines = find_text_lines(ink)
+    if not lines:
+        return []
+
+    line_height = float(np.median([bottom - top for top, bottom in lines]))
+    gaps = [lines[i + 1][0] - lines[i][1] for i in range(len(lines) - 1)]
+    line_gap = float(np.median(gaps)) if gaps else line_height
+    bands = _merge_runs(lines, int(line_gap * 1.5))
+    column_gap = max(int(line_height * 2), int(width * 0.03))
+    pad = max(2, int(line_height / 4))
+
+    blocks = []
+    for top, bottom in bands:
+        columns = _split_columns(ink[top:bottom], column_gap)
+        if rtl:
+            columns = columns[::-1]
+        for left, right in columns:
+            blocks.append((
+                max(0, left - pad),
+                max(0, top - pad),
+                min(width, right + pad),
+                min(height, bottom + pad),
+            ))
+    return blocks
+
+
+def crop_blocks(image, blocks):
+    """Views of ``image`` for each (x0, y0, x1, y1) block"""
+    return [image[y0:y1, x0:x1] for x0, y0, x1, y1 in blocks]
+
+
+def _strip_hash(strip, size=(64, 8)):
+    """Hash of a row strip shrunk to a small binary thumbnail"""
+    thumb = cv2.resize(strip.astype(np.uint8) * 255, size, interpolation=cv2.INTER_AREA) > 64
+    return hashlib.md5(np.packbits(thumb).tobytes()).hexdigest()
+
+
+def _edge_bands(ink, zone):
+    """Text bands lying in the top/bottom ``zone`` of a page, with their hash and isolation"""
+    height = ink.shape[0]
+    lines = find_text_lines(ink)
+    gaps = [lines[i + 1][0] - lines[i][1] for i in range(len(lines) - 1)]
+    line_gap = float(np.median(gaps)) if gaps else 0.0
+
+    bands = []
+    for k, (top, bottom) in enumerate(lines):
+        if bottom <= zone * height:
+            side = "top"
+            gap = lines[k + 1][0] - bottom if k + 1 < len(lines) else height
+        elif top >= (1 - zone) * height:
+            side = "bottom"
+            gap = top - lines[k - 1][1] if k > 0 else height
+        else:
+            continue
+        bands.append({
+            "side": side,
+            "top": top / height,
+            "bottom": bottom / height,
+            "hash": _strip_hash(ink[top:bottom]),
+            # Well apart from the body text (footer rule, page number...)
+            "isolated": gap >= 2 * line_gap,
+        })
+    return bands
+
+
+def detect_repeated_bands(pages, ink_threshold=127, zone=0.15, min_fraction=0.5, tolerance=0.01):
+    """
+    Find running headers/footers shared by the pages of a document.
+
+    A band near the top or bottom edge counts as repeated when the same row
+    strip (by hash) appears on at least ``min_fraction`` of the pages, or when
+    an isolated band sits at the same height (within ``tolerance`` of the
+    page height) on that many pages, which covers page numbers whose digits
+    change. Returns {"top": ..., "bottom": ...}: the fraction of the page
+    height to cut at each edge, independent of the resolution the pages
+    were rendered at.
+    """
+    page_bands = [_edge_bands(np.asarray(page) < ink_threshold, zone) for page in pages]
+    needed = max(2, int(np.ceil(min_fraction * len(page_bands))))
+    crop = {"top": 0.0, "bottom": 0.0}
+    if len(page_bands) < 2:
+        return crop
+
+    hash_pages = {}
+    for n, bands in enumerate(page_bands):
+        for band in bands:
+            hash_pages.setdefault(band["hash"], set()).add(n)
+
+    for bands in page_bands:
+        for band in bands:
+            repeated = len(hash_pages[band["hash"]]) >= needed
+            if not repeated and band["isolated"]:
+                centre = (band["top"] + band["bottom"]) / 2
+                matches = sum(
+                    1 for other in page_bands
+                    if any(
+                        b["isolated"] and b["side"] == band["side"]
+                        and abs((b["top"] + b["bottom"]) / 2 - centre) <= tolerance
+                        for b in other
+                    )
+                )
+                repeated = matches >= needed
+            if not repeated:
+                continue
+            if band["side"] == "top":
+                crop["top"] = max(crop["top"], float(min(zone, band["bottom"] + tolerance / 2)))
+            else:
+                crop["bottom"] = max(crop["bottom"], float(min(zone, 1 - band["top"] + tolerance / 2)))
+    return crop
@@ -1,5 +1,13 @@
 import PyPDF2
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
+
+from PyPDF2._cmap import parse_to_unicode
+from PyPDF2._codecs import adobe_glyphs, charset_encoding
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, StreamObject
+
+from arabic_text import ARABIC_INDIC_DIGITS
 
 # Standard Adobe Glyph List (AGL) mapping for Arabic characters
 # Based on Unicode standard and Adobe font specifications
@@ -82,6 +90,9 @@ def create_standard_arabic_mapping():
         'tehmarbuta': 'ة',             # U+0629
         'tehmarbutafinal': 'ة',
         
+        # Tatweel (kashida)
+        'tatweel': 'ـ',                # U+0640
+        
         # Diacritics
         'fatha': 'َ',                  # U+064E
         'damma': 'ُ',                  # U+064F  
@@ -130,68 +141,160 @@ def create_standard_arabic_mapping():
 # Create the standard mapping
 mapping = create_standard_arabic_mapping()
 
-def decode_tokens(token_text):
+# Positional suffixes understood by GlyphDecoder.parse_agl_name, in the order it tries them
+AGL_SUFFIXES = (
+    ('initial', 'initial'),
+    ('medial', 'medial'),
+    ('final', 'final'),
+    ('isolated', ''),
+)
+
+class GlyphDecoder:
     """
-    Decode Arabic glyph tokens to Arabic text using Adobe Glyph List standards
+    Compiled version of the decode_tokens lookup rules.
+    
+    The indexes are built once from a mapping, so every rule that used to scan
+    the whole mapping (case-insensitive match, AGL positional parsing, partial
+    match) becomes a dictionary or trie lookup. Each distinct token is resolved
+    only once; known and unknown tokens are both memoized.
     """
-    result = []
-    tokens = token_text.split("/")
     
-    for token in tokens:
-        token = token.strip()
-        if not token:  # Skip empty tokens
-            continue
+    def __init__(self, mapping):
+        self.mapping = dict(mapping)
+        self.keys = list(self.mapping)
+        self.values = [self.mapping[key] for key in self.keys]
+        
+        # lowercase key -> first value, for case-insensitive matches
+        self.lower_index = {}
+        # lowercase key -> first position in the mapping
+        self.lower_position = {}
+        # any substring of a lowercase key -> first position of such a key
+        self.substring_position = {}
+        # prefix trie; each node keeps, per positional suffix, the value of the
+        # first key under that prefix ending with it ('' = any key)
+        self.trie = {'children': {}, 'first': {}}
+        
+        for position, key in enumerate(self.keys):
+            value = self.values[position]
+            key_lower = key.lower()
+            self.lower_index.setdefault(key_lower, value)
+            self.lower_position.setdefault(key_lower, position)
+            for start in range(len(key_lower)):
+                for stop in range(start + 1, len(key_lower) + 1):
+                    self.substring_position.setdefault(key_lower[start:stop], position)
             
+            suffixes = [pos for _, pos in AGL_SUFFIXES if key.endswith(pos)]
+            node = self.trie
+            for char in [None] + list(key):
+                if char is not None:
+                    node = node['children'].setdefault(char, {'children': {}, 'first': {}})
+                for pos in suffixes:
+                    node['first'].setdefault(pos, value)
+        
+        self.max_key_length = max((len(key) for key in self.keys), default=0)
+        self.memo = {}
+    
+    def _prefix_lookup(self, prefix, pos):
+        """First value whose key starts with prefix and ends with pos"""
+        node = self.trie
+        for char in prefix:
+            node = node['children'].get(char)
+            if node is None:
+                return None
+        return node['first'].get(pos)
+    
+    def parse_agl_name(self, glyph_name):
+        """
+        Character of an Adobe Glyph List style name, letter then positional
+        form (e.g. 'lamfinal', 'sadmedial')
+        """
+        for suffix, pos in AGL_SUFFIXES:
+            if glyph_name.endswith(suffix):
+                base_name = glyph_name[:-len(suffix)] if suffix else glyph_name
+                
+                value = self._prefix_lookup(base_name, pos)
+                if value is not None:
+                    return value
+                
+                arabic_key = f'arabic{base_name}'
+                if arabic_key in self.mapping:
+                    return self.mapping[arabic_key]
+        
+        return None
+    
+    def _partial_match(self, token_lower):
+        """First key contained in the token, or containing it"""
+        best = self.substring_position.get(token_lower)
+        longest = min(len(token_lower), self.max_key_length)
+        if '' in self.lower_position:
+            best = self.lower_position[''] if best is None else min(best, self.lower_position[''])
+        for start in range(len(token_lower)):
+            for stop in range(start + 1, min(start + longest, len(token_lower)) + 1):
+                position = self.lower_position.get(token_lower[start:stop])
+                if position is not None and (best is None or position < best):
+                    best = position
+        return None if best is None else self.values[best]
+    
+    def _resolve(self, token):
+        value = self.lookup(token)
+        if value is None:
+            print(f"Unknown glyph token: '{token}' - please add to mapping")
+            return "?"
+        return value
+    
+    def lookup(self, token):
+        """Text of one glyph token, or None when no rule knows it"""
         # Handle direct Arabic text that might be mixed in
         if is_arabic_text(token):
-            result.append(token)
-            continue
-            
+            return token
+        
         # Handle numbers
         if token.isdigit():
-            # Convert to Arabic-Indic numerals if desired
-            arabic_digits = ['٠','١','٢','٣','٤','٥','٦','٧','٨','٩']
+            # Convert single digits to Arabic-Indic numerals
             if len(token) == 1:
-                result.append(arabic_digits[int(token)])
-            else:
-                result.append(token)  # Keep multi-digit numbers as-is
-            continue
-        
-        # Try exact match first
-        if token in mapping:
-            result.append(mapping[token])
-            continue
+                return ARABIC_INDIC_DIGITS[int(token)]
+            return token  # Keep multi-digit numbers as-is
         
-        # Try case-insensitive match
+        # Exact, then case-insensitive match
+        if token in self.mapping:
+            return self.mapping[token]
         token_lower = token.lower()
-        found = False
-        for key, value in mapping.items():
-            if key.lower() == token_lower:
-                result.append(value)
-                found = True
-                break
+        if token_lower in self.lower_index:
+            return self.lower_index[token_lower]
         
-        if found:
-            continue
-            
-        # Try to parse using AGL naming conventions
-        parsed_char = parse_agl_name(token)
+        # AGL naming conventions
+        parsed_char = self.parse_agl_name(token)
         if parsed_char:
-            result.append(parsed_char)
-            continue
-            
-        # Last resort: partial matching
-        for key in mapping:
-            if token.lower() in key.lower() or key.lower() in token.lower():
-                result.append(mapping[key])
-                found = True
-                break
+            return parsed_char
         
-        if not found:
-            print(f"Unknown glyph token: '{token}' - please add to mapping")
-            result.append("?")
+        # Last resort: partial matching
+        return self._partial_match(token_lower)
     
-    return "".join(result)
+    def decode(self, token_text):
+        """Decode one string of /-separated glyph tokens"""
+        memo = self.memo
+        result = []
+        for token in token_text.split("/"):
+            token = token.strip()
+            if not token:  # Skip empty tokens
+                continue
+            decoded = memo.get(token)
+            if decoded is None:
+                decoded = memo[token] = self._resolve(token)
+            result.append(decoded)
+        return "".join(result)
+    
+    def decode_pages(self, pages):
+        """Decode a batch of page texts; returns one string per page"""
+        return [self.decode(text) for text in pages]
+
+decoder = GlyphDecoder(mapping)
+
+def decode_tokens(token_text):
+    """
+    Decode Arabic glyph tokens to Arabic text using Adobe Glyph List standards
+    """
+    return decoder.decode(token_text)
 
 def is_arabic_text(text):
     """Check if text contains Arabic characters"""
@@ -200,61 +303,334 @@ def is_arabic_text(text):
             return True
     return False
 
-def parse_agl_name(glyph_name):
+# --- Text layer extraction ---------------------------------------------------
+#
+# The fonts of these PDFs name their glyphs (/Differences) instead of
+# mapping them to Unicode, so PyPDF2's extract_text gives "/lamfinal/..."
+# runs that decode_tokens has to guess back. Here each font's code -> text
+# table is built once from its /Encoding, /Differences names and
+# /ToUnicode map, cached per font resource, and the content streams are
+# decoded with it directly.
+
+# One token of a content stream, after any whitespace or comment: literal string
+# (nested parentheses are left to read_literal_string), hex string,
+# dict/array delimiter, name, number or operator
+CONTENT_TOKEN = re.compile(rb"""
+    (?:\s|%[^\r\n]*)*
+    (?:
+    \((?P<string>(?:[^()\\]|\\.)*)\)
+  | (?P<nested>\()
+  | (?P<hex><[0-9A-Fa-f\s]*>)
+  | (?P<delimiter><<|>>|\[|\]|\{|\})
+  | (?P<name>/[^\s/\[\]()<>{}%]*)
+  | (?P<number>[+-]?(?:\d+\.?\d*|\.\d+))
+  | (?P<operator>[^\s/\[\]()<>{}%]+)
+  | (?P<stray>.)
+    )?
+""", re.VERBOSE | re.DOTALL)
+
+STRING_ESCAPE = re.compile(rb'\\([0-7]{1,3}|\r\n|.)', re.DOTALL)
+STRING_ESCAPES = {b'n': b'\n', b'r': b'\r', b't': b'\t', b'b': b'\b', b'f': b'\f',
+                  b'(': b'(', b')': b')', b'\\': b'\\', b'\r\n': b'', b'\r': b'', b'\n': b''}
+
+# Operators whose operands matter for the text: font, text matrix and showing
+TEXT_OPERATORS = {b'BT', b'Tf', b'Td', b'TD', b'Tm', b'T*', b'TL', b'Tj', b'TJ', b"'", b'"', b'Do'}
+
+def _unescape(match):
+    escape = match.group(1)
+    if escape[:1].isdigit():
+        return bytes([int(escape, 8) & 0xFF])
+    # Unknown escapes stand for the character itself
+    return STRING_ESCAPES.get(escape, escape)
+
+def unescape_string(raw):
+    return STRING_ESCAPE.sub(_unescape, raw) if b'\\' in raw else raw
+
+def read_literal_string(data, pos):
+    """Parse a literal string with nested parentheses from just after its "("; returns (bytes, end)"""
+    depth = 1
+    start = pos
+    while pos < len(data):
+        char = data[pos]
+        if char == 0x5C:  # backslash: skip the escaped character
+            pos += 2
+            continue
+        if char == 0x28:
+            depth += 1
+        elif char == 0x29:
+            depth -= 1
+            if depth == 0:
+                return unescape_string(data[start:pos]), pos + 1
+        pos += 1
+    return unescape_string(data[start:]), len(data)
+
+def iter_content_operations(data):
     """
-    Parse Adobe Glyph List naming convention
-    Format: letterpostionalform (e.g., 'lamfinal', 'sadmedial')
+    Yield (operands, operator) for the text operators of a content stream.
+    Strings are bytes, arrays lists; other operators only clear the stack.
     """
-    # Common positional suffixes in AGL
-    suffixes = {
-        'initial': 'initial',
-        'medial': 'medial', 
-        'final': 'final',
-        'isolated': ''
-    }
+    operands = []
+    arrays = []
+    tokens = CONTENT_TOKEN.finditer(data)
+    while True:
+        match = next(tokens, None)
+        if match is None:
+            return
+        kind = match.lastgroup
+        if kind == 'string':
+            value = unescape_string(match.group('string'))
+        elif kind == 'number':
+            value = float(match.group(kind))
+        elif kind == 'name':
+            value = match.group(kind).decode('latin-1')
+        elif kind == 'operator':
+            operator = match.group(kind)
+            if operator in TEXT_OPERATORS:
+                yield operands, operator
+            elif operator == b'ID':
+                # Inline image data runs up to EI; it is binary, skip it
+                end = re.compile(rb'\sEI(?=\s|$)').search(data, match.end())
+                tokens = CONTENT_TOKEN.finditer(data, end.end() if end else len(data))
+            operands = []
+            arrays = []
+            continue
+        elif kind == 'delimiter':
+            token = match.group(kind)
+            if token == b'[':
+                arrays.append(operands)
+                operands = []
+            elif token == b']' and arrays:
+                array = operands
+                operands = arrays.pop()
+                operands.append(array)
+            continue  # dictionaries only appear in operands we skip
+        elif kind == 'hex':
+            digits = re.sub(rb'\s', b'', match.group(kind)[1:-1])
+            value = bytes.fromhex((digits + b'0' * (len(digits) % 2)).decode())
+        elif kind == 'nested':
+            value, end = read_literal_string(data, match.end())
+            tokens = CONTENT_TOKEN.finditer(data, end)
+        else:  # trailing whitespace, stray delimiter
+            continue
+        operands.append(value)
+
+def glyph_to_unicode(glyph_name):
+    """Text of a glyph named in a font's /Differences, e.g. 'lamfinal' -> 'ل', or None"""
+    standard = adobe_glyphs.get('/' + glyph_name)
+    if standard is not None:
+        return standard
+    uni = re.fullmatch(r'uni((?:[0-9A-F]{4})+)|u([0-9A-F]{4,6})', glyph_name)
+    if uni:
+        hexcode = uni.group(1) or uni.group(2)
+        step = 4 if uni.group(1) else len(hexcode)
+        return ''.join(chr(int(hexcode[i:i + step], 16)) for i in range(0, len(hexcode), step))
+    # Arabic positional names: the mapping and AGL rules of decode_tokens
+    return decoder.lookup(glyph_name)
+
+def font_glyph_table(font):
+    """
+    (bytes per code, code -> text) for a font dictionary: its /Encoding
+    (base encoding then /Differences names) overridden by /ToUnicode.
+    """
+    table = {}
+    encoding = font.get('/Encoding')
+    encoding = encoding.get_object() if encoding is not None else None
+    if isinstance(encoding, str) and encoding in charset_encoding:
+        base = charset_encoding[encoding]
+    elif isinstance(encoding, DictionaryObject) and encoding.get('/BaseEncoding') in charset_encoding:
+        base = charset_encoding[encoding['/BaseEncoding']]
+    else:
+        base = charset_encoding['/StandardCoding']
+    for code, char in enumerate(base):
+        if char:
+            table[code] = char
+    names = {}  # code -> glyph name, from /Differences
+    if isinstance(encoding, DictionaryObject) and '/Differences' in encoding:
+        code = 0
+        for item in encoding['/Differences']:
+            if isinstance(item, int):
+                code = item
+            else:
+                names[code] = str(item).lstrip('/')
+                code += 1
     
-    for suffix, pos in suffixes.items():
-        if glyph_name.endswith(suffix):
-            base_name = glyph_name[:-len(suffix)] if suffix else glyph_name
-            
-            # Try to find the base character
-            for key in mapping:
-                if key.startswith(base_name) and (not pos or key.endswith(pos)):
-                    return mapping[key]
+    code_bytes = 2 if font.get('/Subtype') == '/Type0' else 1
+    to_unicode = {}
+    if '/ToUnicode' in font:
+        map_dict, _, _ = parse_to_unicode(font, 32)
+        code_bytes = map_dict.pop(-1, code_bytes)
+        codec = 'charmap' if code_bytes == 1 else 'utf-16-be'
+        for key, text in map_dict.items():
+            to_unicode[int.from_bytes(key.encode(codec, 'surrogatepass'), 'big')] = text
+    
+    # Glyph names only matter for the codes /ToUnicode leaves out
+    unknown = []
+    for code, name in names.items():
+        if code in to_unicode:
+            continue
+        text = glyph_to_unicode(name)
+        if text is None:
+            unknown.append(name)
+            text = '?'
+        table[code] = text
+    if unknown:
+        print(f"Font {str(font.get('/BaseFont', '')).lstrip('/')}: no text for glyph(s) "
+              f"{', '.join(sorted(set(unknown)))}")
+    table.update(to_unicode)
+    return code_bytes, table
+
+class TextLayerExtractor:
+    """
+    Text of PDF pages read straight from their content streams.
+    
+    Glyph tables are built once per font resource (fonts are shared by
+    many pages) and kept for the life of the extractor. Lines break where
+    the text moves down by more than half a line of the current font.
+    """
+    
+    def __init__(self, pdf_path):
+        self.reader = PyPDF2.PdfReader(pdf_path)
+        self.fonts = {}
+    
+    def font(self, fonts, name):
+        """(bytes per code, translation) of the font resource ``name``, cached by object"""
+        ref = fonts.raw_get(name) if name in fonts else None
+        if ref is None:
+            return 1, {}
+        # Font dictionaries written inline have no object number to cache by
+        key = (ref.idnum, ref.generation) if isinstance(ref, IndirectObject) else None
+        cached = self.fonts.get(key)
+        if cached is None:
+            code_bytes, table = font_glyph_table(ref.get_object())
+            if code_bytes == 1:
+                # One str.translate over the latin-1 decoded string
+                table = {code: table.get(code, '') for code in range(256)}
+            cached = (code_bytes, table)
+            if key is not None:
+                self.fonts[key] = cached
+        return cached
+    
+    def decode(self, font, data):
+        code_bytes, table = font
+        if code_bytes == 1:
+            return data.decode('latin-1').translate(table)
+        return ''.join(
+            table.get(int.from_bytes(data[i:i + code_bytes], 'big'), '')
+            for i in range(0, len(data) - code_bytes + 1, code_bytes)
+        )
+    
+    def page_text(self, index):
+        page = self.reader.pages[index]
+        out = []
+        self._render(page.get('/Contents'), page.get('/Resources'), out)
+        return ''.join(out).strip('\n')
+    
+    def _render(self, contents, resources, out, depth=0):
+        resources = resources.get_object() if resources is not None else DictionaryObject()
+        fonts = resources.get('/Font')
+        fonts = fonts.get_object() if fonts is not None else DictionaryObject()
+        
+        contents = contents.get_object() if contents is not None else None
+        if isinstance(contents, ArrayObject):
+            data = b'\n'.join(part.get_object().get_data() for part in contents)
+        elif isinstance(contents, StreamObject):
+            data = contents.get_data()
+        else:
+            return
+        
+        font = (1, {})
+        size = 1.0
+        leading = 0.0
+        line = [1.0, 0.0, 0.0, 1.0, 0.0, 0.0]  # text line matrix
+        last_y = None
+        for operands, operator in iter_content_operations(data):
+            if operator == b'Tf' and len(operands) == 2:
+                font = self.font(fonts, operands[0])
+                size = operands[1]
+                continue
+            if operator == b'BT':
+                line = [1.0, 0.0, 0.0, 1.0, 0.0, 0.0]
+                continue
+            if operator == b'TL' and operands:
+                leading = operands[0]
+                continue
+            if operator == b'Tm' and len(operands) == 6:
+                line = list(operands)
+                continue
+            if operator in (b'Td', b'TD') and len(operands) == 2:
+                tx, ty = operands
+                if operator == b'TD':
+                    leading = -ty
+                line[4] += tx * line[0] + ty * line[2]
+                line[5] += tx * line[1] + ty * line[3]
+                continue
+            if operator in (b'T*', b"'", b'"'):
+                line[4] += -leading * line[2]
+                line[5] += -leading * line[3]
+                if operator == b'T*':
+                    continue
+            if operator == b'Do' and operands and depth < 8:
+                xobjects = resources.get('/XObject')
+                xobject = xobjects.get_object().get(operands[0]) if xobjects is not None else None
+                xobject = xobject.get_object() if xobject is not None else None
+                if xobject is not None and xobject.get('/Subtype') == '/Form':
+                    self._render(xobject, xobject.get('/Resources', resources), out, depth + 1)
+                continue
             
-            # Try with 'arabic' prefix
-            arabic_key = f'arabic{base_name}'
-            if arabic_key in mapping:
-                return mapping[arabic_key]
+            # Showing text: Tj, TJ, ' and "
+            shown = operands[-1] if operands else b''
+            if isinstance(shown, list):
+                text = ''.join(self.decode(font, item) for item in shown if isinstance(item, bytes))
+            elif isinstance(shown, bytes):
+                text = self.decode(font, shown)
+            else:
+                continue
+            if not text:
+                continue
+            y = line[5]
+            if last_y is not None and abs(y - last_y) > abs(size * line[3]) / 2:
+                out.append('\n')
+            last_y = y
+            out.append(text)
+
+# Extractor owned by each pool worker, opened once by _init_text_worker
+_text_extractor = None
+
+def _init_text_worker(pdf_path):
+    global _text_extractor
+    _text_extractor = TextLayerExtractor(pdf_path)
+
+def _page_text_task(index):
+    return _text_extractor.page_text(index)
+
+def extract_text_layer(pdf_path, workers=None, pages=None):
+    """
+    Text layer of each page (0-based ``pages``, None = all), as a list.
     
-    return None
+    Pages are spread over ``workers`` processes (None = one per CPU), each
+    opening the PDF once and building its font tables once.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if pages is None:
+        pages = range(len(PyPDF2.PdfReader(pdf_path).pages))
+    pages = list(pages)
+    if workers <= 1 or len(pages) <= 1:
+        extractor = TextLayerExtractor(pdf_path)
+        return [extractor.page_text(i) for i in pages]
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_text_worker, initargs=(pdf_path,)
+    ) as pool:
+        # Contiguous chunks: neighbouring pages tend to share fonts
+        chunksize = max(1, len(pages) // (workers * 4))
+        return list(pool.map(_page_text_task, pages, chunksize=chunksize))
 
-def extract_and_parse_arabic_pdf(pdf_path):
+def extract_and_parse_arabic_pdf(pdf_path, workers=None):
     """
-    Extract text from PDF and parse Arabic glyph tokens
+    Extract the text layer of a PDF, decoding its Arabic glyph names
     """
     try:
-        with open(pdf_path, "rb") as file:
-            reader = PyPDF2.PdfReader(file)
-            
-            all_text = []
-            for i, page in enumerate(reader.pages):
-                text = page.extract_text()
-                print(f"--- Raw Page {i+1} ---")
-                print(text[:200] + "..." if len(text) > 200 else text)
-                print()
-                
-                # Parse Arabic tokens if they exist
-                if "/" in text and any(token in text for token in ["arabicalef", "lam", "noon", "meem"]):
-                    parsed_text = decode_tokens(text)
-                    print(f"--- Parsed Arabic Page {i+1} ---")
-                    print(parsed_text)
-                    print("-" * 50)
-                    all_text.append(parsed_text)
-                else:
-                    all_text.append(text)
-            
-            return "\n".join(all_text)
+        return "\n".join(extract_text_layer(pdf_path, workers=workers))
     
     except FileNotFoundError:
         print(f"File {pdf_path} not found!")
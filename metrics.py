@@ -0,0 +1,171 @@
+import cProfile
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class JsonLinesSink:
+    """Append each record to a file as one JSON object per line"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def __call__(self, record):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def confidence_stats(values):
+    """count/mean/min/max of engine confidences (0-100), None when there are none"""
+    if not values:
+        return None
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values),
+        "min": min(values),
+        "max": max(values),
+    }
+
+
+class Metrics:
+    """
+    Per-page timing and counters for ArabicPDFOCR.
+
+    Code being measured wraps its work in ``stage(name)`` (seconds add up
+    per name), calls ``count`` for counters such as cache hits and
+    ``confidences`` with the engine's scores. Everything recorded while a
+    ``page(...)`` block is open lands in that page's record; stages timed
+    before it (rendering the page) are carried into the next page opened.
+    Finished records go to ``sink``: a callable taking the record dict, or a
+    path written as JSON lines. Without a sink only ``last`` is kept.
+
+    Code interested in the records as they come (ArabicPDFOCR.iter_page_records)
+    registers with ``listen``. Fields whose name starts with an underscore
+    (a page's text lines) are for listeners only and left out of the sink.
+
+    ``profile_dir`` dumps a cProfile of every page there
+    (page_0017.prof, for pstats/snakeviz); ``trace_memory`` adds the peak
+    Python allocation size of each page, from tracemalloc.
+    """
+
+    def __init__(self, sink=None, profile_dir=None, trace_memory=False):
+        if isinstance(sink, (str, Path)):
+            sink = JsonLinesSink(sink)
+        self.sink = sink
+        self.profile_dir = profile_dir
+        self.trace_memory = trace_memory
+        self.last = None
+        self._record = None
+        self._pending = {}
+        self._listeners = []
+
+    def __getstate__(self):
+        # Sinks (open files, callbacks) stay in the parent: pool workers
+        # hand their records back with the page results instead
+        state = self.__dict__.copy()
+        state["sink"] = None
+        state["last"] = None
+        state["_record"] = None
+        state["_pending"] = {}
+        state["_listeners"] = []
+        return state
+
+    def record_stage(self, name, seconds):
+        stages = self._record["stages"] if self._record is not None else self._pending
+        stages[name] = stages.get(name, 0.0) + seconds
+
+    def pop_pending(self, name):
+        """Take back the seconds recorded as ``name`` outside any page (0.0 if none)"""
+        return self._pending.pop(name, 0.0)
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(name, time.perf_counter() - start)
+
+    def timed(self, iterable, name):
+        """Iterate ``iterable``, timing each step (e.g. rendering the next page) as ``name``"""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.record_stage(name, time.perf_counter() - start)
+            yield item
+
+    def count(self, name, n=1):
+        if self._record is not None:
+            self._record[name] = self._record.get(name, 0) + n
+
+    def note(self, **fields):
+        """Set fields of the open page record (why OCR was skipped...)"""
+        if self._record is not None:
+            self._record.update(fields)
+
+    def confidences(self, values):
+        if self._record is not None:
+            self._record["_confidences"].extend(float(value) for value in values)
+
+    @contextmanager
+    def page(self, page_number, **fields):
+        """Collect one record for ``page_number``; extra fields (engine, dpi...) are stored as is"""
+        record = {"type": "page", "page": page_number, **fields,
+                  "stages": self._pending, "_confidences": []}
+        self._pending = {}
+        self._record = record
+        profiler = None
+        if self.profile_dir:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = time.perf_counter() - start
+            if self.trace_memory:
+                record["memory_peak"] = tracemalloc.get_traced_memory()[1]
+            if profiler is not None:
+                profiler.disable()
+                out_dir = Path(self.profile_dir)
+                out_dir.mkdir(parents=True, exist_ok=True)
+                name = page_number[0] if isinstance(page_number, list) else page_number
+                profile_path = out_dir / f"page_{name:04d}.prof"
+                profiler.dump_stats(str(profile_path))
+                record["profile"] = str(profile_path)
+            record["confidence"] = confidence_stats(record.pop("_confidences"))
+            self._record = None
+            self.emit(record)
+
+    def document(self, **fields):
+        """Emit a document-level record: stages timed outside any page (writing the output...)"""
+        record = {"type": "document", **fields, "stages": self._pending}
+        self._pending = {}
+        self.emit(record)
+
+    @contextmanager
+    def listen(self, callback):
+        """Also hand every record emitted inside the block to ``callback``, underscore fields included"""
+        self._listeners.append(callback)
+        try:
+            yield
+        finally:
+            self._listeners.remove(callback)
+
+    def emit(self, record):
+        """Hand a finished record to the sink (also used for records coming back from workers)"""
+        self.last = record
+        for callback in self._listeners:
+            callback(record)
+        if self.sink is not None:
+            self.sink({name: value for name, value in record.items() if not name.startswith("_")})
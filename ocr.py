@@ -1,29 +1,254 @@
-import cv2
+import json
 import numpy as np
 from PIL import Image
-import pdf2image
-import pytesseract
-import easyocr
-import fitz  # PyMuPDF
-import io
 from pathlib import Path
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
 
-import arabic_reshaper
-from bidi.algorithm import get_display
-import re
+import time
+from collections import deque
+from contextlib import ExitStack
+
+from pdftoimage import iter_pdf_pages, max_page_bytes, pdf_page_count
+from tesseract_pool import TesseractPool
+import preprocess as preprocessing
+from preprocess import PreprocessGraph
+from layout import crop_blocks, detect_repeated_bands, find_text_blocks
+from quality import page_passes
+from metrics import Metrics
+from checkpoint import CheckpointedOutput, PageHasher, manifest_config
+from page_ring import PageRing, attach, page_view
+from page_index import dhash, ink_density
+from page_output import PageJsonWriter, SearchablePDFWriter, read_page_records
+from cpu_budget import StageScheduler, available_cores, limit_threads
+import arabic_text
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+# Engine owned by each pool worker, built once by _init_worker, the
+# parent's PageRing memory when pages are handed over through it, and the
+# thread limit its OCR libraries run with (see cpu_budget)
+_worker_ocr = None
+_worker_ring = None
+_worker_threads = None
+
+
+def easyocr_lines(results, min_confidence=0.5):
+    """
+    EasyOCR (bbox, text, confidence) results above min_confidence as text
+    lines like ArabicPDFOCR.tesseract_lines: confidence 0-100, box around
+    the detected polygon
+    """
+    lines = []
+    for bbox, text, confidence in results:
+        if confidence > min_confidence:
+            xs = [point[0] for point in bbox]
+            ys = [point[1] for point in bbox]
+            lines.append({
+                "text": text,
+                "confidence": float(confidence) * 100,
+                "box": (int(min(xs)), int(min(ys)), int(round(max(xs))), int(round(max(ys)))),
+            })
+    return lines
+
+
+def shift_lines(lines, dx, dy):
+    """Copies of ``lines`` with their boxes moved by (dx, dy)"""
+    shifted = []
+    for line in lines:
+        x0, y0, x1, y1 = line["box"]
+        shifted.append({**line, "box": [int(x0) + dx, int(y0) + dy, int(x1) + dx, int(y1) + dy]})
+    return shifted
+
+
+def lines_text(lines):
+    return '\n'.join(line["text"] for line in lines)
+
+
+def _limit_worker_threads(threads):
+    global _worker_threads
+    if threads and threads != _worker_threads:
+        # An explicit torch_threads wins over the worker's share of the CPUs
+        limit_threads(threads, torch_threads=_worker_ocr.torch_threads if _worker_ocr else None)
+        _worker_threads = threads
+
+
+def _init_worker(options, ring_name=None, threads=None):
+    """Build the OCR engine (EasyOCR reader, Tesseract config) once per worker process"""
+    global _worker_ocr, _worker_ring
+    # Before the engines start: OpenMP (torch, a persistent Tesseract)
+    # sizes its pool once, from the environment
+    _limit_worker_threads(threads)
+    _worker_ocr = ArabicPDFOCR(**options).warm_up()
+    if ring_name is not None:
+        _worker_ring = attach(ring_name)
+
+
+def _ocr_page_task(source, index, dpi, preprocess, threads=None):
+    """Load or render one page inside a pool worker and OCR it"""
+    _limit_worker_threads(threads)
+    for i, image in _worker_ocr.iter_page_images(source, dpi=dpi, pages=[index]):
+        with _worker_ocr.metrics.page(i + 1, engine=_worker_ocr.engine):
+            text = _worker_ocr.ocr_page(image, preprocess=preprocess,
+                                        origin=_worker_ocr.page_origin(source, i))
+        # The worker's metrics have no sink: the parent emits the record
+        return i + 1, text, _worker_ocr.metrics.last
+
+
+def _ocr_shared_page_task(source, page, index, render_seconds, preprocess, threads=None):
+    """OCR a page the parent rendered into the shared PageRing, reading it in place"""
+    _limit_worker_threads(threads)
+    image = page_view(_worker_ring, page)
+    _worker_ocr.metrics.record_stage("render", render_seconds)
+    with _worker_ocr.metrics.page(index + 1, engine=_worker_ocr.engine):
+        text = _worker_ocr.ocr_page(image, preprocess=preprocess,
+                                    origin=_worker_ocr.page_origin(source, index))
+    del image
+    return index + 1, text, _worker_ocr.metrics.last
+
+
+def _ocr_adaptive_page_task(source, index, dpis, preprocess, checks):
+    """iter_ocr_pdf_adaptive for one page inside a pool worker"""
+    for page_number, text, dpi in _worker_ocr._iter_adaptive(source, preprocess, dpis, [index], *checks):
+        return page_number, text, dpi, _worker_ocr.metrics.last
 
 
 class ArabicPDFOCR:
-    def __init__(self, use_easyocr=True):
+    def __init__(self, use_easyocr=True, cache=None, tesseract_workers=0,
+                 easyocr_batch_size=None, easyocr_batch_pages=4, torch_threads=None,
+                 preprocess_params=None, debug_dir=None, detect_layout=False,
+                 auto_crop=True, cascade=False, cascade_threshold=60, metrics=None,
+                 page_ring_slots=None, page_ring_bytes=None, skip_blank=True,
+                 blank_ink=0.0002, page_index=None, keep_lines=False):
         self.use_easyocr = use_easyocr
-        if use_easyocr:
-            self.reader = easyocr.Reader(['ar'])  # Arabic and English
+        # Cascade mode: Tesseract everywhere, EasyOCR again on the lines whose
+        # Tesseract confidence is below cascade_threshold (0-100)
+        self.cascade = cascade
+        self.cascade_threshold = cascade_threshold
+        self.tesseract_config = r'--oem 3 --psm 6 -l ara+fra'
+        # Persistent Tesseract processes (needs tesserocr); 0 = one
+        # pytesseract subprocess per image
+        self.tesseract_workers = tesseract_workers
+        self._tesseract_pool = None
+        # Preprocessing stage graph; only the stages feeding "output" run.
+        # Parameters are part of the cache key and can be overridden per run
+        # by passing a dict as ``preprocess``. Stage images are dumped to
+        # debug_dir when it is set.
+        self.preprocess_graph = PreprocessGraph(debug_dir=debug_dir)
+        self.preprocess_params = preprocess_params or {}
+        self._debug_count = 0
+        # Run OCR only on the text blocks found by layout.find_text_blocks
+        self.detect_layout = detect_layout
+        # Crop the headers/footers repeated across a document instead of a
+        # fixed band (see detect_margins)
+        self.auto_crop = auto_crop
+        # Optional OCRCache shared by every page (and every pool worker)
+        self.cache = cache
+        # Before OCR, pages are checked once watermark removal has run:
+        # pages with less ink than blank_ink (fraction of dark pixels) are
+        # blank and give no text, and pages found in the optional PageIndex
+        # (same look, same engine) reuse the text OCRed for that page
+        self.skip_blank = skip_blank
+        self.blank_ink = blank_ink
+        self.page_index = page_index
+        # Keep the text lines of every page with their boxes (page pixels)
+        # and confidences, for iter_page_records; Tesseract then reads pages
+        # line by line (image_to_data) and the cache holds the lines as JSON
+        self.keep_lines = keep_lines
+        # Stage timings, confidences and cache hits per page (see metrics.Metrics)
+        self.metrics = metrics if metrics is not None else Metrics()
+        # With workers, pages are rendered once here into a shared memory
+        # PageRing of page_ring_slots buffers (None = 2 per worker, 0 = each
+        # worker renders its own pages); page_ring_bytes caps its total size
+        self.page_ring_slots = page_ring_slots
+        self.page_ring_bytes = page_ring_bytes
+        # Batched EasyOCR recognition: regions per recognizer call, and how
+        # many pages iter_ocr_pdf groups together (None = plain readtext)
+        self.easyocr_batch_size = easyocr_batch_size
+        self.easyocr_batch_pages = easyocr_batch_pages
+        # Engines are built on first use (or by warm_up): importing easyocr
+        # pulls in torch, which a Tesseract-only run never needs. torch_threads
+        # sets torch's threads there, over the share of the CPUs a pool
+        # worker or server engine gets otherwise (see cpu_budget.limit_threads)
+        self.torch_threads = torch_threads
+        self._reader = None
+        # Engine errors swallowed so far (the page gets empty text): results
+        # read while this grew are not cached nor offered to later pages
+        self.ocr_failures = 0
+    
+    @property
+    def needs_reader(self):
+        return self.use_easyocr or self.cascade
+    
+    @property
+    def reader(self):
+        """The EasyOCR reader, loaded the first time it is needed"""
+        if self._reader is None:
+            import easyocr
+            if self.torch_threads:
+                import torch
+                torch.set_num_threads(self.torch_threads)
+            self._reader = easyocr.Reader(['ar'])  # Arabic and English
+        return self._reader
+    
+    @property
+    def tesseract_pool(self):
+        """Persistent Tesseract processes, started on first use; None without tesseract_workers"""
+        if self._tesseract_pool is None and self.tesseract_workers:
+            self._tesseract_pool = TesseractPool(
+                size=self.tesseract_workers, config=self.tesseract_config
+            )
+        return self._tesseract_pool
+    
+    def warm_up(self):
+        """
+        Load the engines this instance uses now instead of on the first page:
+        the EasyOCR models (with one tiny recognition, so the first real page
+        doesn't pay for lazy initialization either) and the Tesseract pool.
+        """
+        if self.needs_reader:
+            self.reader.readtext(np.full((32, 32), 255, dtype=np.uint8))
+        if self.tesseract_pool is None:
+            import pytesseract  # noqa: F401
+        return self
+    
+    @property
+    def engine(self):
+        """Engine used for every page: "tesseract", "easyocr" or "cascade" """
+        if self.cascade:
+            return "cascade"
+        return "easyocr" if self.use_easyocr else "tesseract"
         
-    def load_images_from_folder(self,folder, extensions=(".png", ".jpg", ".jpeg")):
+    def worker_options(self):
+        """Constructor arguments that rebuild this engine inside a pool worker"""
+        return {
+            "use_easyocr": self.use_easyocr,
+            "cache": self.cache,
+            # One persistent Tesseract per worker process is enough
+            "tesseract_workers": min(self.tesseract_workers, 1),
+            "easyocr_batch_size": self.easyocr_batch_size,
+            "easyocr_batch_pages": self.easyocr_batch_pages,
+            "torch_threads": self.torch_threads,
+            "preprocess_params": self.preprocess_params,
+            "debug_dir": self.preprocess_graph.debug_dir,
+            "detect_layout": self.detect_layout,
+            "auto_crop": self.auto_crop,
+            "cascade": self.cascade,
+            "cascade_threshold": self.cascade_threshold,
+            "metrics": self.metrics,
+            "skip_blank": self.skip_blank,
+            "blank_ink": self.blank_ink,
+            "page_index": self.page_index,
+            "keep_lines": self.keep_lines,
+        }
+    
+    def list_image_files(self, folder, extensions=IMAGE_EXTENSIONS):
         folder = Path(folder)
-        image_files = sorted(
+        return sorted(
             [f for f in folder.iterdir() if f.suffix.lower() in extensions]
         )
+    
+    def load_images_from_folder(self,folder, extensions=IMAGE_EXTENSIONS):
+        image_files = self.list_image_files(folder, extensions)
 
         images = []
         for i, file in enumerate(image_files):
@@ -38,42 +263,100 @@ class ArabicPDFOCR:
             return img  
         return img[:h - new_height, :]
     
-    def preprocess_image(self, image):
-        """Preprocess image for better OCR results"""
-        # Convert PIL to OpenCV
-        img_array = np.array(image)
-        if len(img_array.shape) == 3:
-            img = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
-        else:
-            img = img_array
-        
-        # Convert to grayscale
-        if len(img.shape) == 3:
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        else:
-            gray = img
-        
-        # Apply image enhancements
-        # 1. Noise reduction
-        gray=self.resize_from_bottom(gray,150)
-        remove_watermark= self.remove_watermark(gray)
-
-        denoised = cv2.fastNlMeansDenoising(remove_watermark)
-        
-        # 2. Threshold to get better black/white contrast
-        _, thresh = cv2.threshold(denoised, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-        
-        # 3. Morphological operations to clean up text
-        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1,1))
-        cleaned = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
-        cv2.imwrite("cleaned.png", cleaned)
-
-        return remove_watermark
+    def preprocess_params_for(self, preprocess=True):
+        """
+        Stage parameters for one run: the instance defaults, updated with
+        ``preprocess`` when it is a dict such as
+        {"output": "morph", "denoise": {"h": 10}}.
+        """
+        params = {name: dict(value) if isinstance(value, dict) else value
+                  for name, value in self.preprocess_params.items()}
+        if isinstance(preprocess, dict):
+            for name, value in preprocess.items():
+                if isinstance(value, dict):
+                    params.setdefault(name, {}).update(value)
+                else:
+                    params[name] = value
+        return params
+    
+    def preprocess_image(self, image, params=None, stages=None):
+        """Preprocess image for better OCR results (``stages``: see PreprocessGraph.run)"""
+        if params is None:
+            params = self.preprocess_params_for()
+        self._debug_count += 1
+        with self.metrics.stage("preprocess"):
+            return self.preprocess_graph.run(
+                image, params, debug_name=f"page{self._debug_count:04d}",
+                timer=self._time_preprocess_stage, results=stages,
+            )
+    
+    def _time_preprocess_stage(self, name, seconds):
+        self.metrics.record_stage(f"preprocess.{name}", seconds)
+    
+    def fingerprint(self, image, preprocess=True, stages=None):
+        """
+        (ink density, dHash) of a page once its watermark is removed. When
+        preprocessing, the crop and watermark stages run as they will for
+        OCR and are kept in ``stages`` for preprocess_image to continue from.
+        """
+        with self.metrics.stage("triage"):
+            if preprocess:
+                params = {**self.preprocess_params_for(preprocess), "output": "watermark"}
+                marked = self.preprocess_graph.run(
+                    image, params, debug_name=f"page{self._debug_count + 1:04d}",
+                    timer=self._time_preprocess_stage, results=stages,
+                )
+            else:
+                marked = self.remove_watermark(preprocessing.to_gray(image))
+            return ink_density(marked), dhash(marked)
+    
+    def triage(self, image, engine, preprocess=True, stages=None, note=True):
+        """
+        Decide whether a page needs OCR at all. Returns (text, fingerprint):
+        text is "" for a blank page, the text of the near-duplicate found in
+        page_index, or None when the page must be OCRed; fingerprint is what
+        to record in page_index after OCR (None when there is nothing to do).
+        Skips are counted, and noted in the page record when ``note`` is set.
+        """
+        if not self.skip_blank and self.page_index is None:
+            return None, None
+        ink, page_hash = self.fingerprint(image, preprocess, stages)
+        if self.skip_blank and ink < self.blank_ink:
+            self.metrics.count("skipped_blank")
+            if note:
+                self.metrics.note(skipped="blank", ink=ink)
+            return "", None
+        if self.page_index is None:
+            return None, None
+        signature = self.cache_signature(engine, preprocess)
+        match = self.page_index.find(page_hash, ink, signature)
+        if match is not None:
+            self.metrics.count("skipped_duplicate")
+            if note:
+                self.metrics.note(skipped="duplicate", duplicate_of=match["origin"],
+                                  hash_distance=match["distance"])
+            return match["text"], None
+        return None, (page_hash, ink, signature)
+    
+    def page_origin(self, source, index):
+        """How page_index refers to a page: the source and page number, as in a PDF link"""
+        return f"{source}#page={index + 1}"
+    
+    def engine_failed(self, name, error):
+        """Report an engine error the caller turns into empty text"""
+        print(f"{name} failed: {error}")
+        self.ocr_failures += 1
+        self.metrics.count("ocr_failures")
     
     def ocr_with_tesseract(self, image):
         """Perform OCR using Tesseract"""
         try:
-            config = r'--oem 3 --psm 6 -l ara+fra'
+            config = self.tesseract_config
+            
+            if self.tesseract_pool is not None:
+                return self.tesseract_pool.image_to_string(image).strip()
+            
+            import pytesseract
             
             # If image is numpy array, convert to PIL
             if isinstance(image, np.ndarray):
@@ -82,16 +365,88 @@ class ArabicPDFOCR:
             text = pytesseract.image_to_string(image, config=config)
             return text.strip()
         except Exception as e:
-            print(f"Tesseract OCR failed: {e}")
+            self.engine_failed("Tesseract OCR", e)
             return ""
     
+    def tesseract_lines(self, image):
+        """
+        Run Tesseract and return its text lines, each a dict with "text",
+        "confidence" (mean word confidence, 0-100) and "box" (x0, y0, x1, y1)
+        """
+        try:
+            if self.tesseract_pool is not None:
+                lines = self.tesseract_pool.image_to_lines(image)
+                self.metrics.confidences(line["confidence"] for line in lines)
+                return lines
+            
+            import pytesseract
+            if isinstance(image, np.ndarray):
+                image = Image.fromarray(image)
+            data = pytesseract.image_to_data(
+                image, config=self.tesseract_config, output_type=pytesseract.Output.DICT
+            )
+            lines = {}
+            for i, word in enumerate(data["text"]):
+                confidence = float(data["conf"][i])
+                if confidence < 0 or not word.strip():
+                    continue
+                key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+                x0, y0 = data["left"][i], data["top"][i]
+                x1, y1 = x0 + data["width"][i], y0 + data["height"][i]
+                line = lines.setdefault(key, {"words": [], "confidences": [], "box": [x0, y0, x1, y1]})
+                line["words"].append(word)
+                line["confidences"].append(confidence)
+                box = line["box"]
+                line["box"] = [min(box[0], x0), min(box[1], y0), max(box[2], x1), max(box[3], y1)]
+            lines = [
+                {
+                    "text": " ".join(line["words"]),
+                    "confidence": sum(line["confidences"]) / len(line["confidences"]),
+                    "box": tuple(line["box"]),
+                }
+                for line in lines.values()
+            ]
+            self.metrics.confidences(line["confidence"] for line in lines)
+            return lines
+        except Exception as e:
+            self.engine_failed("Tesseract OCR", e)
+            return []
+    
+    def ocr_with_cascade(self, image, pad=4):
+        """
+        Tesseract first; lines below cascade_threshold confidence are cropped
+        and read again with EasyOCR, whose text replaces Tesseract's when it
+        finds any.
+        """
+        return lines_text(self.cascade_lines(image, pad))
+    
+    def cascade_lines(self, image, pad=4):
+        """ocr_with_cascade keeping the lines; those EasyOCR read again have "engine" set"""
+        image = np.asarray(image)
+        lines = self.tesseract_lines(image)
+        weak = [line for line in lines if line["confidence"] < self.cascade_threshold]
+        if weak:
+            h, w = image.shape[:2]
+            crops = []
+            for line in weak:
+                x0, y0, x1, y1 = line["box"]
+                crops.append(image[max(0, y0 - pad):min(h, y1 + pad), max(0, x0 - pad):min(w, x1 + pad)])
+            if self.easyocr_batch_size:
+                retried = self.ocr_with_easyocr_batch(crops)
+            else:
+                retried = [self.ocr_with_easyocr(crop) for crop in crops]
+            for line, text in zip(weak, retried):
+                if text.strip():
+                    line["text"] = text.replace('\n', ' ')
+                    line["engine"] = "easyocr"
+        return lines
+    
     def ocr_with_easyocr(self, image):
         """Perform OCR using EasyOCR"""
+        if self.easyocr_batch_size:
+            return self.ocr_with_easyocr_batch([image])[0]
         try:
-            if isinstance(image, Image.Image):
-                image = np.array(image)
-            
-            results = self.reader.readtext(image)
+            results = self.easyocr_results(image)
             
             # Extract text and confidence scores
             extracted_text = []
@@ -101,72 +456,880 @@ class ArabicPDFOCR:
             
             return '\n'.join(extracted_text)
         except Exception as e:
-            print(f"EasyOCR failed: {e}")
+            self.engine_failed("EasyOCR", e)
             return ""
+    
+    def easyocr_results(self, image):
+        """EasyOCR (bbox, text, confidence) results for one image, batched when easyocr_batch_size is set"""
+        if self.easyocr_batch_size:
+            return self.easyocr_batch_results([image])[0]
+        results = self.reader.readtext(np.asarray(image))
+        self.metrics.confidences(confidence * 100 for (bbox, text, confidence) in results)
+        return results
+    
+    def easyocr_batch_results(self, images):
+        """
+        Run EasyOCR on several pages, recognizing all their text regions
+        together in batches of easyocr_batch_size.
+        
+        Returns one list of (bbox, text, confidence) per page, bboxes in that
+        page's coordinates.
+        """
+        from easyocr_batch import detect_regions, recognize_regions
+        
+        regions = []
+        for page, image in enumerate(images):
+            regions.extend(detect_regions(self.reader, np.asarray(image), page=page))
+        per_page = [[] for _ in images]
+        for page, bbox, text, confidence in recognize_regions(
+            self.reader, regions, batch_size=self.easyocr_batch_size or 16
+        ):
+            per_page[page].append((bbox, text, confidence))
+            self.metrics.confidences([confidence * 100])
+        return per_page
+    
+    def ocr_with_easyocr_batch(self, images):
+        """Batched ocr_with_easyocr: one text per page, same confidence filter"""
+        try:
+            return [
+                '\n'.join(text for (bbox, text, confidence) in results if confidence > 0.5)
+                for results in self.easyocr_batch_results(images)
+            ]
+        except Exception as e:
+            self.engine_failed("EasyOCR", e)
+            return [""] * len(images)
+    
     def remove_watermark(self,img):
         """Load image in grayscale and apply adaptive threshold to remove watermark/grey text."""
-        _, mask = cv2.threshold(img, 127, 255, cv2.THRESH_BINARY)
-        return mask
-    def ocr_pdf(self, folder, output_file=None, preprocess=True):
+        threshold = self.preprocess_graph.resolve(self.preprocess_params_for())["watermark"]["threshold"]
+        return preprocessing.remove_watermark(img, threshold)
+    def cache_signature(self, engine, preprocess=True):
+        """Describe everything besides the pixels that changes the raw OCR text"""
+        if engine == "easyocr":
+            engine_config = "easyocr ar conf>0.5"
+        elif engine == "cascade":
+            engine_config = (f"cascade tesseract {self.tesseract_config} "
+                             f"< {self.cascade_threshold} > easyocr ar conf>0.5")
+        else:
+            engine_config = f"tesseract {self.tesseract_config}"
+        if preprocess:
+            params = self.preprocess_graph.signature(self.preprocess_params_for(preprocess))
+        else:
+            params = "none"
+        layout = "|layout: blocks" if self.detect_layout else ""
+        lines = "|lines" if self.keep_lines else ""
+        return f"{engine_config}|preprocess: {params}{layout}{lines}"
+    
+    def cached(self, key, scored=False):
         """
-        Perform OCR on entire PDF
+        (text, lines) stored in the cache under ``key``, or None; lines is
+        None without keep_lines. A ``scored`` entry (see recognize_scored)
+        comes back as (text, lines, confidence, has_ink).
         """
-        print(f"Converting PDF to images...")
-        images = self.load_images_from_folder(folder)
+        value = self.cache.get(key)
+        if value is None:
+            return None
+        if scored:
+            value = json.loads(value)
+            return value["text"], value["lines"], value["confidence"], value["has_ink"]
+        if self.keep_lines:
+            lines = json.loads(value)
+            return lines_text(lines), lines
+        return value, None
+    
+    def store(self, key, text, lines, score=None):
+        """Cache a page's text and lines, with its (confidence, has_ink) when ``score`` is given"""
+        if score is not None:
+            confidence, has_ink = score
+            value = json.dumps({"text": text, "lines": lines, "confidence": confidence, "has_ink": has_ink},
+                               ensure_ascii=False)
+        elif self.keep_lines:
+            value = json.dumps(lines, ensure_ascii=False)
+        else:
+            value = text
+        self.cache.put(key, value)
+    
+    def text_blocks(self, processed):
+        """
+        (x0, y0, x1, y1) boxes of the preprocessed page the engines should
+        read, in reading order: the text blocks when detect_layout is on,
+        else the whole page.
+        """
+        processed = np.asarray(processed)
+        if not self.detect_layout:
+            return [(0, 0, processed.shape[1], processed.shape[0])]
+        with self.metrics.stage("layout"):
+            return find_text_blocks(processed)
+    
+    def text_regions(self, processed):
+        """Crops of the preprocessed page for text_blocks"""
+        if not self.detect_layout:
+            return [processed]
+        processed = np.asarray(processed)
+        return crop_blocks(processed, self.text_blocks(processed))
+    
+    def processed_origin(self, image, preprocess=True):
+        """Where the preprocessed page starts on the page: (x, y) in page pixels"""
+        if not preprocess:
+            return 0, 0
+        crop = self.preprocess_graph.resolve(self.preprocess_params_for(preprocess))["crop"]
+        return 0, preprocessing.crop_rows(np.asarray(image).shape[0], **crop)[0]
+    
+    def region_lines(self, region, engine):
+        """Text lines of one region (see tesseract_lines), boxes in region pixels"""
+        if engine == "easyocr":
+            return easyocr_lines(self.easyocr_results(region))
+        if engine == "cascade":
+            return self.cascade_lines(region)
+        return self.tesseract_lines(region)
+    
+    def ocr_image(self, processed, engine):
+        """OCR a preprocessed page region by region and stitch the text back together"""
+        if self.keep_lines:
+            return lines_text(self.ocr_image_lines(processed, engine))
+        texts = []
+        for region in self.text_regions(processed):
+            with self.metrics.stage("ocr"):
+                if engine == "easyocr":
+                    text = self.ocr_with_easyocr(region)
+                elif engine == "cascade":
+                    text = self.ocr_with_cascade(region)
+                else:
+                    text = self.ocr_with_tesseract(region)
+            if text:
+                texts.append(text)
+        return '\n'.join(texts)
+    
+    def ocr_image_lines(self, processed, engine):
+        """ocr_image keeping the text lines (see tesseract_lines), boxes in the pixels of ``processed``"""
+        lines = []
+        try:
+            processed = np.asarray(processed)
+            blocks = self.text_blocks(processed)
+            for (x0, y0, _, _), region in zip(blocks, crop_blocks(processed, blocks)):
+                with self.metrics.stage("ocr"):
+                    lines.extend(shift_lines(self.region_lines(region, engine), x0, y0))
+        except Exception as e:
+            self.engine_failed("OCR", e)
+        return lines
+    
+    def ocr_image_scored(self, processed, engine):
+        """
+        ocr_image_lines that also measures the engine's confidence: returns
+        (lines, confidence), confidence 0-100 weighted by the lines' text
+        length, or None when unknown (no text, or cascade, which mixes two
+        engines' scales)
+        """
+        lines = self.ocr_image_lines(processed, engine)
+        weight = sum(len(line["text"]) for line in lines)
+        if engine == "cascade" or not weight:
+            return lines, None
+        return lines, sum(line["confidence"] * len(line["text"]) for line in lines) / weight
+    
+    def recognize_scored(self, image, engine, preprocess=True, stages=None):
+        """
+        recognize_lines() returning (text, confidence, has_ink, lines) for
+        quality checks. The cache keeps the confidence and ink with the text,
+        so a hit is judged as the page was when it was OCRed (the pixels in
+        the key tell its dpi apart). Triage is left to the caller.
+        """
+        text, lines, confidence, has_ink = self.recognize_lines(image, engine, preprocess, stages=stages,
+                                                                scored=True)
+        return text, confidence, has_ink, lines
+    
+    def recognize(self, image, engine, preprocess=True, processed=None, origin=None):
+        """Return the raw OCR text of a page with the given engine (see recognize_lines)"""
+        return self.recognize_lines(image, engine, preprocess, processed, origin)[0]
+    
+    def recognize_lines(self, image, engine, preprocess=True, processed=None, origin=None, stages=None,
+                        scored=False):
+        """
+        Return (text, lines): the raw OCR text of a page with the given
+        engine and, with keep_lines, its text lines (see tesseract_lines)
+        with boxes in page pixels, else None.
         
-        if not images:
-            print("Failed to convert PDF to images")
-            return ""
+        With a cache set, a hit skips preprocessing and OCR entirely, and so
+        do blank pages and near-duplicates of pages in page_index (see
+        triage), which ``origin`` (page_origin) names when this page is added.
+        A blank page has no lines; a near-duplicate only brings its text
+        (lines None). ``processed`` can carry an already preprocessed image
+        to use on a miss, ``stages`` the preprocessing stages triage already
+        ran.
         
-        all_text = []
+        ``scored`` skips triage and returns (text, lines, confidence,
+        has_ink) instead, see recognize_scored.
+        """
+        image = np.asarray(image)
+        self.metrics.count("pixels", image.shape[0] * image.shape[1])
+        key = None
+        if self.cache is not None:
+            signature = self.cache_signature(engine, preprocess)
+            key = self.cache.key(image, signature + "|scored+confidence" if scored else signature)
+            hit = self.cached(key, scored)
+            if hit is not None:
+                self.metrics.count("cache_hits")
+                return hit
+            self.metrics.count("cache_misses")
         
-        for i, image in enumerate(images):
-            print(f"Processing page {i+1}/{len(images)}...")
-            
+        failures = self.ocr_failures
+        fingerprint = None
+        if processed is None:
+            stages = {} if stages is None else stages
+            if not scored:
+                text, fingerprint = self.triage(image, engine, preprocess, stages)
+                if text is not None:
+                    return text, ([] if self.keep_lines and not text else None)
             if preprocess:
-                processed_image = self.preprocess_image(image)
+                processed = self.preprocess_image(image, self.preprocess_params_for(preprocess), stages)
             else:
-                processed_image = image
-            
-            # Perform OCR
-            if self.use_easyocr:
-                text = self.ocr_with_easyocr(processed_image)
+                processed = image
+        lines = None
+        score = None
+        if scored:
+            lines, confidence = self.ocr_image_scored(processed, engine)
+            score = confidence, bool((np.asarray(processed) < 128).mean() > 0.001)
+        elif self.keep_lines:
+            lines = self.ocr_image_lines(processed, engine)
+        if lines is not None:
+            text = lines_text(lines)
+            lines = shift_lines(lines, *self.processed_origin(image, preprocess)) if self.keep_lines else None
+        else:
+            text = self.ocr_image(processed, engine)
+        
+        # A failed engine's empty text is this run's result only
+        if self.ocr_failures == failures:
+            if key is not None:
+                self.store(key, text, lines, score)
+            if fingerprint is not None:
+                self.page_index.add(*fingerprint, text, origin)
+        if scored:
+            return (text, lines) + score
+        return text, lines
+    
+    def recognize_batch(self, images, engine, preprocess=True, origins=None):
+        """
+        recognize() for several pages at once: cache lookups and triage per
+        page, then a single batched EasyOCR call for all the pages left.
+        """
+        return [text for text, _ in self.recognize_batch_lines(images, engine, preprocess, origins)]
+    
+    def recognize_batch_lines(self, images, engine, preprocess=True, origins=None):
+        """recognize_batch returning (text, lines) per page, as recognize_lines does"""
+        if origins is None:
+            origins = [None] * len(images)
+        if engine != "easyocr":
+            return [self.recognize_lines(image, engine, preprocess=preprocess, origin=origin)
+                    for image, origin in zip(images, origins)]
+        
+        images = [np.asarray(image) for image in images]
+        for image in images:
+            self.metrics.count("pixels", image.shape[0] * image.shape[1])
+        results = [None] * len(images)
+        keys = [None] * len(images)
+        if self.cache is not None:
+            signature = self.cache_signature(engine, preprocess)
+            for i, image in enumerate(images):
+                keys[i] = self.cache.key(image, signature)
+                results[i] = self.cached(keys[i])
+        
+        misses = [i for i, result in enumerate(results) if result is None]
+        if self.cache is not None:
+            self.metrics.count("cache_hits", len(images) - len(misses))
+            self.metrics.count("cache_misses", len(misses))
+        # The group shares one record: skips are only counted there
+        stages = {i: {} for i in misses}
+        fingerprints = {}
+        for i in misses:
+            text, fingerprints[i] = self.triage(images[i], engine, preprocess, stages[i], note=False)
+            if text is not None:
+                results[i] = text, ([] if self.keep_lines and not text else None)
+        misses = [i for i in misses if results[i] is None]
+        params = self.preprocess_params_for(preprocess)
+        regions = []
+        owners = []  # (page, x, y) of each region
+        for i in misses:
+            processed = self.preprocess_image(images[i], params, stages[i]) if preprocess else images[i]
+            blocks = self.text_blocks(processed)
+            regions.extend(crop_blocks(np.asarray(processed), blocks))
+            owners.extend((i, x0, y0) for x0, y0, _, _ in blocks)
+        
+        page_lines = {i: [] for i in misses}
+        failures = self.ocr_failures
+        with self.metrics.stage("ocr"):
+            try:
+                recognized = self.easyocr_batch_results(regions)
+            except Exception as e:
+                self.engine_failed("EasyOCR", e)
+                recognized = [[] for _ in regions]
+        for (i, x0, y0), region_results in zip(owners, recognized):
+            page_lines[i].extend(shift_lines(easyocr_lines(region_results), x0, y0))
+        for i in misses:
+            lines = shift_lines(page_lines[i], *self.processed_origin(images[i], preprocess))
+            text = lines_text(lines)
+            results[i] = text, (lines if self.keep_lines else None)
+            if self.ocr_failures != failures:
+                continue
+            if keys[i] is not None:
+                self.store(keys[i], *results[i])
+            if fingerprints[i] is not None:
+                self.page_index.add(*fingerprints[i], text, origins[i])
+        return results
+    
+    def postprocess_text(self, text):
+        """Reshape Arabic letters and reorder for display"""
+        with self.metrics.stage("postprocess"):
+            return arabic_text.to_display(text)
+    
+    def note_lines(self, image, lines):
+        """
+        With keep_lines, keep a page's lines and pixel size in its metrics
+        record, where iter_page_records picks them up
+        """
+        if self.keep_lines:
+            height, width = np.asarray(image).shape[:2]
+            self.metrics.note(_lines=lines, _size=[width, height])
+    
+    def ocr_page(self, image, preprocess=True, origin=None):
+        """Run preprocessing, OCR and reshape/bidi on a single page image"""
+        text, lines = self.recognize_lines(image, self.engine, preprocess=preprocess, origin=origin)
+        self.note_lines(image, lines)
+        return self.postprocess_text(text)
+    
+    def ocr_pages(self, images, preprocess=True, origins=None):
+        """ocr_page for a group of pages, batching EasyOCR across them"""
+        results = self.recognize_batch_lines(images, self.engine, preprocess=preprocess, origins=origins)
+        if self.keep_lines:
+            # The group's record holds one entry per page
+            sizes = [list(np.asarray(image).shape[1::-1]) for image in images]
+            self.metrics.note(_lines=[lines for _, lines in results], _size=sizes)
+        return [self.postprocess_text(text) for text, _ in results]
+    
+    def iter_page_images(self, source, dpi=200, pages=None):
+        """
+        Yield (page_index, image) from a PDF file or a folder of page images.
+        
+        PDF pages are rendered in memory and streamed, so no PNG is written.
+        Rendering/loading time goes to the "render" stage of the next page record.
+        """
+        if self.is_pdf(source):
+            yield from self.metrics.timed(iter_pdf_pages(source, dpi=dpi, pages=pages), "render")
+            return
+        image_files = self.list_image_files(source)
+        page_indices = pages if pages is not None else range(len(image_files))
+        for i in page_indices:
+            with self.metrics.stage("render"):
+                image = Image.open(image_files[i])
+                image.load()
+            yield i, image
+    
+    def detect_margins(self, source, sample_pages=15, dpi=72, pages=None):
+        """
+        Find the running header/footer bands of a document from a sample of
+        its pages (of ``pages`` only, 0-based, when there are at least two),
+        rendered at low resolution. Returns crop stage parameters as fractions
+        of the page height, so they apply at any dpi. A one-page document
+        gets the crop stage defaults.
+        """
+        candidates = list(pages) if pages is not None else []
+        if len(candidates) < 2:
+            # Bands repeat across pages: a single page can't show them
+            candidates = list(range(self.page_count(source)))
+        if len(candidates) < 2:
+            return dict(self.preprocess_graph.resolve(self.preprocess_params_for())["crop"])
+        step = max(1, len(candidates) // sample_pages)
+        sample = candidates[::step][:sample_pages]
+        if self.is_pdf(source):
+            pages = [np.array(image) for _, image in iter_pdf_pages(source, dpi=dpi, pages=sample)]
+        else:
+            image_files = self.list_image_files(source)
+            pages = [np.asarray(Image.open(image_files[i]).convert("L")) for i in sample]
+        return detect_repeated_bands(pages)
+    
+    def with_document_crop(self, source, preprocess=True, pages=None):
+        """Add the document's detected header/footer crop (see detect_margins) to a preprocess spec"""
+        overrides = dict(preprocess) if isinstance(preprocess, dict) else {}
+        if {"top", "bottom"} <= overrides.get("crop", {}).keys():
+            return overrides  # Crop already settled, nothing to detect
+        margins = self.detect_margins(source, pages=pages)
+        print(f"Cropping repeated bands: top {margins['top']:.1%}, bottom {margins['bottom']:.1%}")
+        overrides["crop"] = {**margins, **overrides.get("crop", {})}
+        return overrides
+    
+    def is_pdf(self, source):
+        return Path(source).suffix.lower() == ".pdf"
+    
+    def page_count(self, source):
+        if self.is_pdf(source):
+            return pdf_page_count(source)
+        return len(self.list_image_files(source))
+    
+    def iter_ocr_pdf(self, source, preprocess=True, dpi=200, pages=None, workers=1, ordered=True):
+        """
+        Generator version of ocr_pdf: yields (page_number, text) as soon as
+        each page is done, while later pages have not been rendered yet.
+        
+        With ``workers`` > 1 pages are handed out one at a time to a process
+        pool whose workers each keep a warm engine; results come back in page
+        order, or as soon as each page finishes with ordered=False.
+        """
+        if preprocess and self.auto_crop:
+            pages = list(pages) if pages is not None else None  # read twice: margins, then OCR
+            preprocess = self.with_document_crop(source, preprocess, pages)
+        if workers > 1:
+            yield from self._iter_ocr_parallel(source, preprocess, dpi, pages, workers, ordered)
+            return
+        if self.engine == "easyocr" and self.easyocr_batch_size and self.easyocr_batch_pages > 1:
+            yield from self._iter_ocr_batched(source, preprocess, dpi, pages)
+            return
+        for i, image in self.iter_page_images(source, dpi=dpi, pages=pages):
+            print(f"Processing page {i+1}...")
+            with self.metrics.page(i + 1, engine=self.engine, dpi=dpi):
+                text = self.ocr_page(image, preprocess=preprocess, origin=self.page_origin(source, i))
+            yield i + 1, text
+    
+    def iter_ocr_pdf_adaptive(self, source, preprocess=True, dpis=(150, 200, 300), pages=None,
+                              min_confidence=70, min_sanity=0.9, workers=1, ordered=True):
+        """
+        OCR each page at the lowest resolution that gives a good result.
+        
+        Pages are rendered at dpis[0] first; a page whose confidence or
+        character-level sanity check fails (see quality.page_passes) is
+        rendered again at the next dpi, up to the last one. Yields
+        (page_number, text, dpi) with the dpi finally used for that page.
+        Only PDFs can be re-rendered; image folders are read once (dpi None).
+        ``workers`` and ``ordered`` work as in iter_ocr_pdf: each worker
+        renders and retries its own pages.
+        """
+        if not self.is_pdf(source):
+            for page_number, text in self.iter_ocr_pdf(source, preprocess=preprocess, pages=pages,
+                                                       workers=workers, ordered=ordered):
+                yield page_number, text, None
+            return
+        if preprocess and self.auto_crop:
+            pages = list(pages) if pages is not None else None  # read twice: margins, then OCR
+            preprocess = self.with_document_crop(source, preprocess, pages)
+        checks = (min_confidence, min_sanity)
+        if workers > 1:
+            yield from self._iter_adaptive_parallel(source, preprocess, dpis, pages, checks, workers, ordered)
+            return
+        yield from self._iter_adaptive(source, preprocess, dpis, pages, *checks)
+    
+    def _iter_adaptive(self, source, preprocess, dpis, pages, min_confidence, min_sanity):
+        """iter_ocr_pdf_adaptive once the document crop is settled, in this process"""
+        engine = self.engine
+        for i, image in self.iter_page_images(source, dpi=dpis[0], pages=pages):
+            with self.metrics.page(i + 1, engine=engine) as record:
+                failures = self.ocr_failures
+                dpi = dpis[0]
+                stages = {}
+                text, fingerprint = self.triage(image, engine, preprocess, stages)
+                if text is not None:
+                    passed, reason = True, record["skipped"]
+                    lines = [] if self.keep_lines and not text else None
+                else:
+                    text, confidence, has_ink, lines = self.recognize_scored(image, engine, preprocess, stages)
+                    passed, reason = page_passes(text, confidence, has_ink, min_confidence, min_sanity)
+                for higher in dpis[1:]:
+                    if passed:
+                        break
+                    print(f"Page {i+1}: {reason} at {dpi} dpi, retrying at {higher} dpi")
+                    rendered = iter_pdf_pages(source, dpi=higher, pages=[i])
+                    for _, image in self.metrics.timed(rendered, "render"):
+                        text, confidence, has_ink, lines = self.recognize_scored(image, engine, preprocess)
+                    dpi = higher
+                    passed, reason = page_passes(text, confidence, has_ink, min_confidence, min_sanity)
+                print(f"Page {i+1}: {dpi} dpi ({reason})")
+                record.update(dpi=dpi, quality=reason)
+                self.note_lines(image, lines)
+                # Only results good enough to keep are offered to later pages
+                if passed and fingerprint is not None and self.ocr_failures == failures:
+                    self.page_index.add(*fingerprint, text, self.page_origin(source, i))
+                text = self.postprocess_text(text)
+            yield i + 1, text, dpi
+    
+    def _iter_adaptive_parallel(self, source, preprocess, dpis, pages, checks, workers, ordered=True):
+        page_indices = list(pages if pages is not None else range(self.page_count(source)))
+        threads = max(1, available_cores() // workers)
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(self.worker_options(), None, threads),
+        ) as pool:
+            futures = [
+                pool.submit(_ocr_adaptive_page_task, source, index, dpis, preprocess, checks)
+                for index in page_indices
+            ]
+            results = (future.result() for future in (futures if ordered else as_completed(futures)))
+            for page_number, text, dpi, record in results:
+                self.metrics.emit(record)
+                yield page_number, text, dpi
+    
+    def _iter_ocr_batched(self, source, preprocess, dpi, pages):
+        group = []
+        for i, image in self.iter_page_images(source, dpi=dpi, pages=pages):
+            # Rendered pages are views valid until the next page: keep a copy
+            group.append((i, np.array(image)))
+            if len(group) == self.easyocr_batch_pages:
+                yield from self._ocr_group(source, group, preprocess)
+                group = []
+        if group:
+            yield from self._ocr_group(source, group, preprocess)
+    
+    def _ocr_group(self, source, group, preprocess):
+        print(f"Processing pages {group[0][0]+1}-{group[-1][0]+1}...")
+        # One record for the whole group: its pages are recognized together
+        with self.metrics.page([i + 1 for i, _ in group], engine=self.engine):
+            texts = self.ocr_pages([image for _, image in group], preprocess=preprocess,
+                                   origins=[self.page_origin(source, i) for i, _ in group])
+        for (i, _), text in zip(group, texts):
+            yield i + 1, text
+    
+    def page_slot_bytes(self, source, dpi, page_indices):
+        """Bytes a PageRing slot needs to hold the largest of these pages"""
+        if self.is_pdf(source):
+            return max_page_bytes(source, dpi=dpi, pages=page_indices)
+        image_files = self.list_image_files(source)
+        largest = 0
+        for i in page_indices:
+            with Image.open(image_files[i]) as img:  # reads the header only
+                largest = max(largest, img.width * img.height * len(img.getbands()))
+        return largest
+    
+    def _iter_ocr_parallel(self, source, preprocess, dpi, pages, workers, ordered=True):
+        page_indices = list(pages if pages is not None else range(self.page_count(source)))
+        slots = 2 * workers if self.page_ring_slots is None else self.page_ring_slots
+        if slots and page_indices:
+            yield from self._iter_ocr_shared(source, preprocess, dpi, page_indices, workers, slots, ordered)
+            return
+        n = len(page_indices)
+        # Every worker renders and OCRs its own pages: the cores are split evenly
+        threads = max(1, available_cores() // workers)
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(self.worker_options(), None, threads),
+        ) as pool:
+            if ordered:
+                # chunksize=1: an idle worker always takes the next pending page
+                results = pool.map(
+                    _ocr_page_task,
+                    [source] * n,
+                    page_indices,
+                    [dpi] * n,
+                    [preprocess] * n,
+                    chunksize=1,
+                )
             else:
-                text = self.ocr_with_tesseract(processed_image)
-            reshaped_text = arabic_reshaper.reshape(text)
-            text = get_display(reshaped_text)
-            if text.strip():
-                all_text.append(f"--- Page {i+1} ---")
-                all_text.append(text)
-                all_text.append("")
+                futures = [
+                    pool.submit(_ocr_page_task, source, index, dpi, preprocess)
+                    for index in page_indices
+                ]
+                results = (future.result() for future in as_completed(futures))
+            for page_number, text, record in results:
+                print(f"Processed page {page_number}")
+                self.metrics.emit(record)
+                yield page_number, text
+    
+    def _iter_ocr_shared(self, source, preprocess, dpi, page_indices, workers, slots, ordered):
+        """
+        Parallel OCR with the pages rendered here, once, into a PageRing that
+        the workers read in place. Rendering waits for a free slot, which
+        bounds memory to the ring whatever the document length.
+        
+        A cpu_budget.StageScheduler measures the render and OCR cost of the
+        pages as they go: when rendering here can't keep the workers busy,
+        part of the pages are rendered by the workers instead, and the
+        workers' OCR libraries get the threads the rendering leaves free.
+        """
+        slot_bytes = max(1, self.page_slot_bytes(source, dpi, page_indices))
+        if self.page_ring_bytes:
+            slots = max(1, min(slots, self.page_ring_bytes // slot_bytes))
+        print(f"Sharing pages through {slots} buffer(s) of {slot_bytes / 2**20:.1f} MB")
+        scheduler = StageScheduler(workers)
+        
+        finished = {}  # page_number -> text, waiting for the pages before it
+        expected = iter([i + 1 for i in page_indices])
+        next_page = next(expected)
+        
+        # Pages rendered here are fed one at a time to a single renderer,
+        # which keeps the document open across pages
+        render_queue = deque()
         
-        final_text = '\n'.join(all_text)
+        def parent_pages():
+            while True:
+                yield render_queue.popleft()
         
-        # Save to file if specified
+        rendered = self.iter_page_images(source, dpi=dpi, pages=parent_pages())
+        
+        with PageRing(slots, slot_bytes) as ring, ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(self.worker_options(), ring.name, scheduler.threads()),
+        ) as pool:
+            running = {}  # future -> PageRing descriptor (None: worker rendered it)
+            
+            def collect(block):
+                nonlocal next_page
+                if block:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                else:
+                    done = [future for future in running if future.done()]
+                for future in done:
+                    page = running.pop(future)
+                    if page is not None:
+                        ring.release(page)
+                    page_number, text, record = future.result()
+                    print(f"Processed page {page_number}")
+                    if page is None:
+                        scheduler.observe_render(record["stages"].get("render", 0.0))
+                    scheduler.observe_page(record)
+                    self.metrics.emit(record)
+                    finished[page_number] = text
+                ready = []
+                if not ordered:
+                    ready = list(finished.items())
+                    finished.clear()
+                while next_page in finished:
+                    ready.append((next_page, finished.pop(next_page)))
+                    next_page = next(expected, None)
+                return ready
+            
+            try:
+                for i in page_indices:
+                    if scheduler.offload():
+                        # Pages handed to the workers need no slot, but as
+                        # many are kept in flight as the ring holds
+                        while len(running) >= slots:
+                            yield from collect(block=True)
+                        future = pool.submit(_ocr_page_task, source, i, dpi, preprocess, scheduler.threads())
+                        running[future] = None
+                        yield from collect(block=False)
+                        continue
+                    render_queue.append(i)
+                    _, image = next(rendered)
+                    image = np.asarray(image)
+                    render_seconds = self.metrics.pop_pending("render")
+                    scheduler.observe_render(render_seconds)
+                    while not ring.has_free():
+                        yield from collect(block=True)
+                    if image.nbytes > ring.slot_bytes:
+                        # Larger than estimated (unusual image mode): let the worker load it
+                        future = pool.submit(_ocr_page_task, source, i, dpi, preprocess, scheduler.threads())
+                        running[future] = None
+                    else:
+                        page = ring.put(image)
+                        future = pool.submit(_ocr_shared_page_task, source, page, i, render_seconds,
+                                             preprocess, scheduler.threads())
+                        running[future] = page
+                    yield from collect(block=False)
+                while running:
+                    yield from collect(block=True)
+            finally:
+                rendered.close()
+        print(f"CPU budget: {scheduler.describe()}")
+    
+    def iter_page_records(self, source, preprocess=True, dpi=200, pages=None, workers=1, ordered=True):
+        """
+        iter_ocr_pdf yielding one dict per page as soon as it is done: the
+        page's metrics record (engine, stages, seconds, confidence, skipped...)
+        with "source", "page", "text" (as ocr_pdf outputs it), "lines" and
+        "size". With keep_lines, lines are the page's text lines as the
+        engine read them, {"text", "confidence", "box"}, boxes in pixels of
+        the page image of [width, height] "size"; they are None otherwise, or
+        when unknown (near-duplicate pages). Pages recognized together share
+        their group's record, whose page numbers are listed in "group".
+        A tuple ``dpi`` works as in ocr_pdf.
+        """
+        pending = {}  # page number -> (its metrics record, position in the record)
+        
+        def keep(record):
+            if record["type"] == "page":
+                numbers = record["page"] if isinstance(record["page"], list) else [record["page"]]
+                for position, number in enumerate(numbers):
+                    pending[number] = record, position
+        
+        with self.metrics.listen(keep):
+            for page_number, text in self._iter_ocr_output(source, preprocess, dpi, workers, pages, ordered):
+                record, position = pending.pop(page_number)
+                yield self.page_record(source, page_number, text, record, position)
+    
+    def page_record(self, source, page_number, text, record, position=0):
+        """Structured output of a page from its text and metrics record (see iter_page_records)"""
+        fields = {name: value for name, value in record.items()
+                  if name not in ("type", "page") and not name.startswith("_")}
+        lines = record.get("_lines")
+        size = record.get("_size")
+        if isinstance(record["page"], list):
+            fields["group"] = record["page"]
+            lines = lines[position] if lines is not None else None
+            size = size[position] if size is not None else None
+        return {"source": str(source), "page": page_number, "text": text, **fields,
+                "lines": lines, "size": size}
+    
+    def open_page_writers(self, stack, source, jsonl_file=None, searchable_pdf=None, done_pages=()):
+        """
+        Writers of ocr_pdf's structured outputs, closed with ``stack``.
+        ``done_pages`` are the page numbers an interrupted run already did:
+        their JSON records are kept, and replayed into the searchable PDF.
+        """
+        writers = []
+        if jsonl_file:
+            writers.append(stack.enter_context(PageJsonWriter(jsonl_file, keep_pages=set(done_pages))))
+        if searchable_pdf:
+            if not self.is_pdf(source):
+                raise ValueError("A searchable PDF can only be made from a PDF source")
+            pdf = stack.enter_context(SearchablePDFWriter(source, searchable_pdf))
+            if done_pages:
+                if jsonl_file:
+                    for record in read_page_records(jsonl_file):
+                        pdf.add(record)
+                else:
+                    print(f"Pages done before resuming get no text layer in {searchable_pdf}")
+            writers.append(pdf)
+        return writers
+    
+    def ocr_pdf(self, source, output_file=None, preprocess=True, dpi=200, workers=1, resume=True,
+                jsonl_file=None, searchable_pdf=None):
+        """
+        Perform OCR on entire PDF
+        
+        ``source`` is either the PDF itself (pages are streamed straight from
+        PyMuPDF) or a folder of images made by convert_pdf_to_images.
+        ``workers`` > 1 spreads the pages over that many processes.
+        ``preprocess`` may be a dict of stage overrides for this run, e.g.
+        {"output": "threshold", "crop": {"bottom": 0.05}}.
+        A tuple of dpis, e.g. dpi=(150, 300), renders each page at the
+        lowest one that passes the quality checks (iter_ocr_pdf_adaptive);
+        the dpi used for each page is reported.
+        
+        With ``output_file`` each page is appended to the file as soon as it
+        (and every page before it) is done, and a manifest next to it lets an
+        interrupted run continue from the first unfinished page (``resume``);
+        see checkpoint.CheckpointedOutput.
+        
+        Structured results are streamed as pages finish: ``jsonl_file`` gets
+        one JSON record per page (see iter_page_records), and
+        ``searchable_pdf`` a copy of the source PDF with the text of every
+        page added as an invisible layer over its lines (see
+        page_output.SearchablePDFWriter). Both are made of the text lines,
+        which only keep_lines records.
+        """
+        if (jsonl_file or searchable_pdf) and not self.keep_lines:
+            raise ValueError("jsonl_file and searchable_pdf need the text lines: "
+                             "create ArabicPDFOCR with keep_lines=True")
         if output_file:
-            with open(output_file, 'w', encoding='utf-8') as f:
-                f.write(final_text)
-            print(f"OCR results saved to {output_file}")
+            return self._ocr_pdf_to_file(source, output_file, preprocess, dpi, workers, resume,
+                                         jsonl_file, searchable_pdf)
+        
+        all_text = []
+        with ExitStack() as stack:
+            writers = self.open_page_writers(stack, source, jsonl_file, searchable_pdf)
+            for page_number, text in self._iter_ocr_output(source, preprocess, dpi, workers,
+                                                           writers=writers):
+                if text.strip():
+                    all_text.append(f"--- Page {page_number} ---")
+                    all_text.append(text)
+                    all_text.append("")
+        
+        self.metrics.document(source=str(source), engine=self.engine, output_file=None)
+        return '\n'.join(all_text)
+    
+    def _iter_ocr_output(self, source, preprocess, dpi, workers, pages=None, ordered=True, writers=()):
+        """
+        (page_number, text) pairs for ocr_pdf, adaptive when dpi is a tuple;
+        each page's record (iter_page_records) also goes to ``writers``
+        """
+        if writers:
+            records = self.iter_page_records(source, preprocess, dpi, pages, workers, ordered)
+            return self._iter_written(records, writers)
+        if isinstance(dpi, (tuple, list)):
+            return (
+                (page_number, text)
+                for page_number, text, _ in self.iter_ocr_pdf_adaptive(
+                    source, preprocess=preprocess, dpis=dpi, pages=pages, workers=workers, ordered=ordered
+                )
+            )
+        return self.iter_ocr_pdf(source, preprocess=preprocess, dpi=dpi, pages=pages,
+                                 workers=workers, ordered=ordered)
+    
+    def _iter_written(self, records, writers):
+        write_seconds = 0.0
+        for record in records:
+            start = time.perf_counter()
+            for writer in writers:
+                writer.add(record)
+            write_seconds += time.perf_counter() - start
+            yield record["page"], record["text"]
+        self.metrics.record_stage("write", write_seconds)
+    
+    def _ocr_pdf_to_file(self, source, output_file, preprocess, dpi, workers, resume,
+                         jsonl_file=None, searchable_pdf=None):
+        if self.is_pdf(source):
+            hasher = PageHasher(source)
+        else:
+            hasher = PageHasher(source, image_files=self.list_image_files(source))
+        config = {
+            "source": str(Path(source).resolve()),
+            "signature": self.cache_signature(self.engine, preprocess),
+            "dpi": list(dpi) if isinstance(dpi, (tuple, list)) else dpi,
+        }
+        page_indices = range(self.page_count(source))
+        if preprocess and self.auto_crop:
+            # One crop for the whole document, kept in the manifest: a resumed
+            # run crops its pages like the ones already written
+            stored = manifest_config(output_file) if resume else None
+            if stored is not None and "crop" in stored and {
+                name: value for name, value in stored.items() if name != "crop"
+            } == config:
+                preprocess = dict(preprocess) if isinstance(preprocess, dict) else {}
+                preprocess["crop"] = {**preprocess.get("crop", {}), **stored["crop"]}
+            else:
+                preprocess = self.with_document_crop(source, preprocess)
+            config["crop"] = preprocess["crop"]
+        write_seconds = 0.0
+        with ExitStack() as stack:
+            output = stack.enter_context(
+                CheckpointedOutput(output_file, page_indices, hasher, config, resume=resume)
+            )
+            remaining = set(output.remaining)
+            done_pages = [i + 1 for i in page_indices if i not in remaining]
+            writers = self.open_page_writers(stack, source, jsonl_file, searchable_pdf, done_pages)
+            if output.remaining:
+                # Pages may finish out of order; the output reorders them
+                for page_number, text in self._iter_ocr_output(
+                    source, preprocess, dpi, workers, pages=output.remaining, ordered=False,
+                    writers=writers,
+                ):
+                    start = time.perf_counter()
+                    output.add(page_number - 1, text)
+                    write_seconds += time.perf_counter() - start
+        print(f"OCR results saved to {output_file}")
         
-        return final_text
+        self.metrics.record_stage("write", write_seconds)
+        self.metrics.document(source=str(source), engine=self.engine, output_file=str(output_file))
+        with open(output_file, encoding='utf-8') as f:
+            return f.read()
     def clean_text(self,text: str) -> str:
         # Remove Unicode LTR/RTL marks (U+200E, U+200F, etc.)
-        cleaned = re.sub(r'[\u200e\u200f]', '', text)
-        return cleaned
+        return arabic_text.normalize(text)
     def compare_ocr_methods(self, folder, page_num=0):
         """Compare different OCR methods on a single page"""
         images = self.load_images_from_folder(folder)
         if not images or page_num >= len(images):
             return
         
-        image = images[page_num]
-        processed = self.preprocess_image(image)
+        image = np.asarray(images[page_num])
+        preprocess = self.with_document_crop(folder) if self.auto_crop else True
+        # Without a cache both engines are guaranteed misses: preprocess once
+        processed = None
+        if self.cache is None:
+            processed = self.preprocess_image(image, self.preprocess_params_for(preprocess))
         
         print(f"=== OCR Comparison for Page {page_num + 1} ===\n")
         
         # EasyOCR
-        if hasattr(self, 'reader'):
-            easy_text = self.ocr_with_easyocr(processed)
+        if self.needs_reader:
+            easy_text = self.recognize(image, "easyocr", preprocess=preprocess, processed=processed)
             print("EasyOCR Result:")
             print(easy_text)
             print("\n" + "="*50 + "\n")
@@ -174,7 +1337,7 @@ class ArabicPDFOCR:
                 f.write(self.clean_text(easy_text))
         
         # Tesseract
-        tesseract_text = self.ocr_with_tesseract(processed)
+        tesseract_text = self.recognize(image, "tesseract", preprocess=preprocess, processed=processed)
         print("Tesseract Result:")
         print(tesseract_text)
     
@@ -207,7 +1370,7 @@ def main():
     except Exception as e:
         print(f"OCR failed: {e}")
         print("\nMake sure you have installed the required packages:")
-        print("pip install opencv-python pillow pdf2image pytesseract easyocr PyMuPDF")
+        print("pip install opencv-python pillow pytesseract easyocr PyMuPDF")
         print("\nFor Tesseract, also install:")
         print("- Windows: Download from GitHub releases")
         print("- Ubuntu: sudo apt install tesseract-ocr tesseract-ocr-ara")
@@ -0,0 +1,75 @@
+import hashlib
+import time
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from sqlite_store import SQLiteStore
+
+
+class OCRCache(SQLiteStore):
+    """
+    Persistent, content-addressed cache of raw per-page OCR text.
+
+    Entries are keyed by a hash of the page pixels plus a signature string
+    describing the preprocessing parameters and the engine/config used.
+    The store is a SQLite file in WAL mode, so several worker processes can
+    read and write it at once; when the stored text exceeds ``max_bytes`` the
+    least recently used entries are evicted. Connections are handled by
+    SQLiteStore.
+    """
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS pages ("
+        " key TEXT PRIMARY KEY,"
+        " text TEXT NOT NULL,"
+        " size INTEGER NOT NULL,"
+        " last_used REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS pages_lru ON pages (last_used)",
+    )
+
+    def __init__(self, path="ocr_cache.sqlite", max_bytes=256 * 1024 * 1024):
+        super().__init__(Path(path))
+        self.max_bytes = max_bytes
+
+    def key(self, image, signature: str) -> str:
+        """Hash the page pixels together with the preprocessing/engine signature"""
+        pixels = np.ascontiguousarray(image)
+        h = hashlib.sha256()
+        h.update(f"{pixels.shape}|{pixels.dtype}|{signature}".encode("utf-8"))
+        h.update(memoryview(pixels).cast("B"))
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        conn = self._connect()
+        row = conn.execute("SELECT text FROM pages WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE pages SET last_used = ? WHERE key = ?", (time.time(), key))
+        return row[0]
+
+    def put(self, key: str, text: str):
+        size = len(text.encode("utf-8"))
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO pages (key, text, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, text, size, time.time()),
+            )
+            self._evict(conn)
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        stale = []
+        for key, size in conn.execute("SELECT key, size FROM pages ORDER BY last_used"):
+            stale.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        conn.executemany("DELETE FROM pages WHERE key = ?", stale)
+
+    def clear(self):
+        self._connect().execute("DELETE FROM pages")
@@ -0,0 +1,328 @@
+import argparse
+import itertools
+import json
+import queue
+import shutil
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from cpu_budget import available_cores, limit_threads
+from ocr import IMAGE_EXTENSIONS, ArabicPDFOCR
+
+# End of a job's result stream
+_DONE = object()
+
+
+class Job:
+    """One uploaded document waiting for (or going through) an engine"""
+
+    def __init__(self, path, options, priority=0):
+        self.path = path
+        self.options = options
+        self.priority = priority
+        self.results = queue.Queue()
+        self.cancelled = False
+
+
+class JobQueue:
+    """
+    Bounded priority queue of jobs: lower priority numbers go first, equal
+    priorities in arrival order. ``submit`` refuses jobs when the queue is
+    full instead of blocking, so the server can push back on clients.
+    """
+
+    def __init__(self, maxsize=8):
+        self._queue = queue.PriorityQueue(maxsize=maxsize)
+        self._order = itertools.count()
+
+    def submit(self, job):
+        try:
+            self._queue.put_nowait((job.priority, next(self._order), job))
+        except queue.Full:
+            return False
+        return True
+
+    def get(self):
+        return self._queue.get()[2]
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def full(self):
+        return self._queue.full()
+
+
+class OCRServer(ThreadingHTTPServer):
+    """
+    Local OCR service keeping ``engines`` ArabicPDFOCR instances warm.
+
+    POST /ocr with a PDF (or a single page image) as the body queues a job;
+    query parameters ``priority`` (int, lower first), ``dpi`` (int, or a JSON
+    list for adaptive resolution) and ``preprocess`` (JSON, as for
+    ArabicPDFOCR.ocr_pdf) are optional. The reply streams one JSON object per
+    line: {"page": n, "text": ...} for every page as it is done, then
+    {"done": true} (or {"error": ...}). A full queue answers 429 with a
+    Retry-After header. GET /health reports the engines and queue depth.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, engines=1, queue_size=8, engine_options=None):
+        super().__init__(address, OCRRequestHandler)
+        self.jobs = JobQueue(queue_size)
+        self.engine_options = engine_options or {}
+        self.busy = 0
+        self._busy_lock = threading.Lock()
+        # The engines run side by side in this process and the OCR libraries'
+        # thread pools are process-wide: each engine gets its share of the cores
+        limit_threads(max(1, available_cores() // engines))
+        # Build every engine up front: this is the cost the server is here to pay once
+        self.engines = [ArabicPDFOCR(**self.engine_options).warm_up() for _ in range(engines)]
+        for engine in self.engines:
+            threading.Thread(target=self._engine_loop, args=(engine,), daemon=True).start()
+
+    def _engine_loop(self, engine):
+        while True:
+            job = self.jobs.get()
+            with self._busy_lock:
+                self.busy += 1
+            try:
+                self._run_job(engine, job)
+            except Exception as e:
+                print(f"Job {job.path.name} failed: {e}")
+                job.results.put({"error": str(e)})
+            finally:
+                with self._busy_lock:
+                    self.busy -= 1
+                job.results.put(_DONE)
+                shutil.rmtree(job.path.parent, ignore_errors=True)
+
+    def _run_job(self, engine, job):
+        source = job.path if job.path.suffix.lower() == ".pdf" else job.path.parent
+        dpi = job.options.get("dpi", 200)
+        preprocess = job.options.get("preprocess", True)
+        if isinstance(dpi, list):
+            pages = (
+                (page_number, text)
+                for page_number, text, _ in engine.iter_ocr_pdf_adaptive(
+                    source, preprocess=preprocess, dpis=dpi
+                )
+            )
+        else:
+            pages = engine.iter_ocr_pdf(source, preprocess=preprocess, dpi=dpi)
+        for page_number, text in pages:
+            if job.cancelled:
+                print(f"Job {job.path.name} cancelled by the client")
+                return
+            job.results.put({"page": page_number, "text": text})
+        job.results.put({"done": True})
+
+
+class OCRRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if urllib.parse.urlparse(self.path).path != "/health":
+            self.send_error(404)
+            return
+        body = json.dumps({
+            "engines": len(self.server.engines),
+            "engine": self.server.engines[0].engine if self.server.engines else None,
+            "busy": self.server.busy,
+            "queued": self.server.jobs.qsize(),
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        url = urllib.parse.urlparse(self.path)
+        if url.path != "/ocr":
+            self.send_error(404)
+            return
+        try:
+            query = urllib.parse.parse_qs(url.query)
+            options = {}
+            if "dpi" in query:
+                options["dpi"] = json.loads(query["dpi"][0])
+            if "preprocess" in query:
+                options["preprocess"] = json.loads(query["preprocess"][0])
+            priority = int(query.get("priority", ["0"])[0])
+            filename = Path(query.get("filename", ["document.pdf"])[0]).name
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError as e:
+            self.send_error(400, f"Bad request: {e}")
+            return
+        suffix = Path(filename).suffix.lower()
+        if suffix != ".pdf" and suffix not in IMAGE_EXTENSIONS:
+            self.send_error(415, f"Unsupported file type: {suffix}")
+            return
+        if self.server.jobs.full():
+            # Refuse before reading the upload; submit() checks again below
+            self._too_busy()
+            return
+
+        # Each job gets its own folder: an image job is a one-page image folder
+        job_dir = Path(tempfile.mkdtemp(prefix="ocr_job_"))
+        path = job_dir / filename
+        with open(path, "wb") as f:
+            remaining = length
+            while remaining:
+                chunk = self.rfile.read(min(remaining, 1 << 20))
+                if not chunk:
+                    break
+                f.write(chunk)
+                remaining -= len(chunk)
+
+        job = Job(path, options, priority)
+        if not self.server.jobs.submit(job):
+            shutil.rmtree(job_dir, ignore_errors=True)
+            self._too_busy()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            while True:
+                result = job.results.get()
+                if result is _DONE:
+                    break
+                line = (json.dumps(result, ensure_ascii=False) + "\n").encode("utf-8")
+                self.wfile.write(f"{len(line):X}\r\n".encode("ascii") + line + b"\r\n")
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            job.cancelled = True
+
+    def _too_busy(self):
+        self.send_response(429)
+        self.send_header("Retry-After", "1")
+        self.send_header("Content-Length", "0")
+        # The request body may not have been read
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+
+class OCRClient:
+    """
+    Client for OCRServer with the same calls as ArabicPDFOCR: ocr_pdf and
+    iter_ocr_pdf. ``source`` is a PDF, an image, or a folder of page images
+    (sent one image per job, with the folder's header/footer crop detected
+    here). A busy server (429) is retried ``retries``
+    times, waiting as long as its Retry-After asks.
+    """
+
+    def __init__(self, url="http://127.0.0.1:8765", priority=0, retries=30, timeout=None):
+        self.url = url.rstrip("/")
+        self.priority = priority
+        self.retries = retries
+        self.timeout = timeout
+
+    def health(self):
+        with urllib.request.urlopen(f"{self.url}/health", timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+    def _submit(self, path, preprocess, dpi):
+        query = {
+            "filename": Path(path).name,
+            "priority": self.priority,
+            "dpi": json.dumps(list(dpi) if isinstance(dpi, (tuple, list)) else dpi),
+            "preprocess": json.dumps(preprocess),
+        }
+        data = Path(path).read_bytes()
+        for attempt in range(self.retries + 1):
+            request = urllib.request.Request(
+                f"{self.url}/ocr?{urllib.parse.urlencode(query)}", data=data, method="POST",
+                headers={"Content-Type": "application/octet-stream"},
+            )
+            try:
+                return urllib.request.urlopen(request, timeout=self.timeout)
+            except urllib.error.HTTPError as e:
+                if e.code != 429 or attempt == self.retries:
+                    raise
+                time.sleep(float(e.headers.get("Retry-After", 1)))
+
+    def _iter_job(self, path, preprocess, dpi):
+        with self._submit(path, preprocess, dpi) as response:
+            for line in response:
+                result = json.loads(line)
+                if "error" in result:
+                    raise RuntimeError(f"OCR server: {result['error']}")
+                if "page" in result:
+                    yield result["page"], result["text"]
+
+    def iter_ocr_pdf(self, source, preprocess=True, dpi=200):
+        """Yield (page_number, text) as the server finishes each page"""
+        source = Path(source)
+        if not source.is_dir():
+            yield from self._iter_job(source, preprocess, dpi)
+            return
+        if preprocess:
+            # Each job holds a single image, too little for the server to find
+            # the folder's repeated header/footer bands: they are found here,
+            # across the folder, and sent as crop parameters
+            preprocess = ArabicPDFOCR(use_easyocr=False).with_document_crop(source, preprocess)
+        image_files = sorted(f for f in source.iterdir() if f.suffix.lower() in IMAGE_EXTENSIONS)
+        for i, image_file in enumerate(image_files):
+            for _, text in self._iter_job(image_file, preprocess, dpi):
+                yield i + 1, text
+
+    def ocr_pdf(self, source, output_file=None, preprocess=True, dpi=200):
+        """Same output as ArabicPDFOCR.ocr_pdf, computed by the server"""
+        all_text = []
+        for page_number, text in self.iter_ocr_pdf(source, preprocess=preprocess, dpi=dpi):
+            if text.strip():
+                all_text.append(f"--- Page {page_number} ---")
+                all_text.append(text)
+                all_text.append("")
+
+        final_text = '\n'.join(all_text)
+        if output_file:
+            with open(output_file, 'w', encoding='utf-8') as f:
+                f.write(final_text)
+            print(f"OCR results saved to {output_file}")
+        return final_text
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OCR server with warm engines")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--engines", type=int, default=1, help="warm engine instances")
+    parser.add_argument("--queue-size", type=int, default=8, help="jobs waiting before 429")
+    parser.add_argument("--engine", choices=("tesseract", "easyocr", "cascade"), default="easyocr")
+    parser.add_argument("--cache", help="OCRCache file shared by the engines")
+    parser.add_argument("--page-index", help="PageIndex file: reuse the text of near-duplicate pages")
+    args = parser.parse_args()
+
+    options = {"use_easyocr": args.engine == "easyocr", "cascade": args.engine == "cascade"}
+    if args.cache:
+        from ocr_cache import OCRCache
+        options["cache"] = OCRCache(args.cache)
+    if args.page_index:
+        from page_index import PageIndex
+        options["page_index"] = PageIndex(args.page_index)
+    print(f"Starting {args.engines} {args.engine} engine(s)...")
+    server = OCRServer((args.host, args.port), args.engines, args.queue_size, options)
+    print(f"Listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+import hashlib
+import time
+from pathlib import Path
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from sqlite_store import SQLiteStore
+
+
+def ink_density(img, level=128):
+    """Fraction of dark pixels in a (thresholded) grayscale page"""
+    img = np.asarray(img)
+    if img.size == 0:
+        return 0.0
+    return float(np.count_nonzero(img < level)) / img.size
+
+
+def dhash(img, size=16):
+    """
+    Difference hash of a grayscale page: shrink it to size x (size + 1) and
+    keep one bit per horizontally adjacent pair (is the right one brighter).
+    Rendering at another dpi, scanner noise or a shift of a few pixels flip
+    a handful of the size * size bits; a different page of text flips a
+    large share of them.
+    """
+    small = cv2.resize(np.asarray(img), (size + 1, size), interpolation=cv2.INTER_AREA)
+    small = small.astype(np.int16)
+    bits = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def hash_bands(page_hash, count, bits=256):
+    """
+    Split a hash into ``count`` bit ranges. Two hashes at most count - 1
+    bits apart agree on at least one range (each differing bit spoils only
+    one), so candidates are found by exact lookups of the ranges.
+    """
+    bands = []
+    for i in range(count):
+        start, stop = i * bits // count, (i + 1) * bits // count
+        bands.append(f"{count}.{i}:{(page_hash >> start) & ((1 << (stop - start)) - 1):x}")
+    return bands
+
+
+class PageIndex(SQLiteStore):
+    """
+    Perceptual hashes of the pages OCRed so far, with their raw text, to
+    reuse the text of a near-duplicate page instead of OCRing it again.
+
+    A page matches an entry recorded with the same signature (engine and
+    preprocessing, see ArabicPDFOCR.cache_signature) when their hashes
+    differ by at most ``max_distance`` bits and their ink densities by at
+    most ``ink_tolerance`` (relative). Distinct pages of text are far apart:
+    on COCArabe.pdf no two pages are closer than 43 of the 256 bits, while
+    the same page rendered at another dpi or with noise stays within 20.
+    Each hash is also stored as max_distance + 1 bands (see hash_bands), so
+    a lookup only compares the few entries sharing a band with the page.
+
+    ``path`` is a SQLite file shared by every document (and every pool
+    worker, in WAL mode like OCRCache), so duplicates are also found across
+    documents; None keeps the index in memory, for one process (and one
+    thread: each OCRServer engine gets its own) only. A page already in the
+    index (same hash and signature) is not added again, and past
+    ``max_rows`` entries the ones least recently added or matched are
+    dropped.
+    """
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS pages ("
+        " id INTEGER PRIMARY KEY,"
+        " signature TEXT NOT NULL,"
+        " ink REAL NOT NULL,"
+        " hash TEXT NOT NULL,"
+        " text TEXT NOT NULL,"
+        " origin TEXT,"
+        " added REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS pages_hash ON pages (signature, hash)",
+        "CREATE INDEX IF NOT EXISTS pages_added ON pages (added)",
+        "CREATE TABLE IF NOT EXISTS bands ("
+        " band TEXT NOT NULL,"
+        " page INTEGER NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS bands_band ON bands (band)",
+        "CREATE INDEX IF NOT EXISTS bands_page ON bands (page)",
+    )
+
+    def __init__(self, path="page_index.sqlite", max_distance=16, ink_tolerance=0.15,
+                 max_rows=100_000, hash_bits=256):
+        super().__init__(Path(path) if path is not None else None)
+        self.max_distance = max_distance
+        self.ink_tolerance = ink_tolerance
+        self.max_rows = max_rows
+        self.hash_bits = hash_bits
+
+    def _bands(self, page_hash, signature):
+        # Signatures are long: bands carry a digest of theirs
+        prefix = hashlib.sha1(signature.encode("utf-8")).hexdigest()[:16]
+        return [f"{prefix}|{band}" for band in hash_bands(page_hash, self.max_distance + 1, self.hash_bits)]
+
+    def find(self, page_hash: int, ink: float, signature: str) -> Optional[dict]:
+        """Closest recorded page within the limits: {"text", "origin", "distance"}, or None"""
+        low = ink * (1 - self.ink_tolerance)
+        high = ink * (1 + self.ink_tolerance)
+        bands = self._bands(page_hash, signature)
+        conn = self._connect()
+        best = None
+        rows = conn.execute(
+            "SELECT id, hash, text, origin FROM pages WHERE id IN"
+            f" (SELECT page FROM bands WHERE band IN ({', '.join('?' * len(bands))}))"
+            " AND ink BETWEEN ? AND ?",
+            (*bands, low, high),
+        )
+        for page_id, stored, text, origin in rows:
+            distance = hamming(page_hash, int(stored, 16))
+            if distance <= self.max_distance and (best is None or distance < best["distance"]):
+                best = {"text": text, "origin": origin, "distance": distance, "id": page_id}
+        if best is None:
+            return None
+        # Pages still being matched are kept longest
+        conn.execute("UPDATE pages SET added = ? WHERE id = ?", (time.time(), best.pop("id")))
+        return best
+
+    def add(self, page_hash: int, ink: float, signature: str, text: str, origin=None):
+        stored = format(page_hash, "x")
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT id FROM pages WHERE signature = ? AND hash = ?", (signature, stored)
+            ).fetchone()
+            if row is not None:
+                # The same page again (a rerun): keep the first entry
+                conn.execute("UPDATE pages SET added = ? WHERE id = ?", (time.time(), row[0]))
+            else:
+                page_id = conn.execute(
+                    "INSERT INTO pages (signature, ink, hash, text, origin, added) VALUES (?, ?, ?, ?, ?, ?)",
+                    (signature, ink, stored, text, origin, time.time()),
+                ).lastrowid
+                conn.executemany(
+                    "INSERT INTO bands (band, page) VALUES (?, ?)",
+                    [(band, page_id) for band in self._bands(page_hash, signature)],
+                )
+                self._evict(conn)
+
+    def _evict(self, conn):
+        excess = conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0] - self.max_rows
+        if excess <= 0:
+            return
+        stale = conn.execute("SELECT id FROM pages ORDER BY added LIMIT ?", (excess,)).fetchall()
+        conn.executemany("DELETE FROM bands WHERE page = ?", stale)
+        conn.executemany("DELETE FROM pages WHERE id = ?", stale)
+
+    def clear(self):
+        conn = self._connect()
+        conn.execute("DELETE FROM bands")
+        conn.execute("DELETE FROM pages")
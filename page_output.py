@@ -0,0 +1,222 @@
+import json
+import os
+import re
+import shutil
+from pathlib import Path
+
+import arabic_text
+from arabic_text import FOLD_PRESENTATION_FORMS
+
+# UCDN script number MuPDF picks its built-in Noto Naskh Arabic by, and
+# the name that font gets in the pages' resources
+ARABIC_SCRIPT = 6
+ARABIC_FONT = "NotoNaskhArabic"
+
+CMAP_RANGE = re.compile(r"<([0-9a-fA-F]+)>\s*<([0-9a-fA-F]+)>\s*<([0-9a-fA-F]+)>")
+CMAP_CHAR = re.compile(r"<([0-9a-fA-F]+)>\s*<([0-9a-fA-F]+)>")
+
+
+def fold_to_unicode(doc, font_xref):
+    """
+    Map the glyphs of a font's ToUnicode CMap to Arabic letters instead of
+    the presentation forms PyMuPDF picks for them, so text copied or
+    searched in the PDF is made of the same characters as the OCR text
+    """
+    cmap_xref = int(doc.xref_get_key(font_xref, "ToUnicode")[1].split()[0])
+    cmap = doc.xref_stream(cmap_xref).decode("latin-1")
+    mapping = {}
+    for block in re.findall(r"beginbfrange(.*?)endbfrange", cmap, re.S):
+        for first, last, start in CMAP_RANGE.findall(block):
+            for offset in range(int(last, 16) - int(first, 16) + 1):
+                mapping[int(first, 16) + offset] = chr(int(start, 16) + offset)
+    for block in re.findall(r"beginbfchar(.*?)endbfchar", cmap, re.S):
+        for code, text in CMAP_CHAR.findall(block):
+            mapping[int(code, 16)] = bytes.fromhex(text).decode("utf-16-be")
+    entries = [
+        f"<{code:04x}> <{text.translate(FOLD_PRESENTATION_FORMS).encode('utf-16-be').hex()}>"
+        for code, text in sorted(mapping.items())
+    ]
+    head = cmap[:cmap.index("endcodespacerange") + len("endcodespacerange")]
+    chunks = [entries[i:i + 100] for i in range(0, len(entries), 100)]
+    body = "".join(f"\n{len(chunk)} beginbfchar\n" + "\n".join(chunk) + "\nendbfchar" for chunk in chunks)
+    tail = "\nendcmap\nCMapName currentdict /CMap defineresource pop\nend\nend\n"
+    doc.update_stream(cmap_xref, (head + body + tail).encode("latin-1"))
+
+
+def read_page_records(path):
+    """Page records of a PageJsonWriter file, skipping a torn last line"""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                return
+
+
+class PageJsonWriter:
+    """
+    Write page records (ArabicPDFOCR.iter_page_records) to a file as one JSON
+    object per line, each flushed as soon as its page is done, so readers can
+    follow the file while the document is still being OCRed.
+
+    ``keep_pages`` continues an interrupted run: the records of those page
+    numbers already in the file are kept, every other record is dropped.
+    """
+
+    def __init__(self, path, keep_pages=None):
+        self.path = Path(path)
+        if keep_pages and self.path.exists():
+            kept = [record for record in read_page_records(self.path) if record["page"] in keep_pages]
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                for record in kept:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            os.replace(tmp, self.path)
+            self._file = open(self.path, "a", encoding="utf-8")
+        else:
+            self._file = open(self.path, "w", encoding="utf-8")
+
+    def add(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class SearchablePDFWriter:
+    """
+    Copy of a PDF with the OCR text of its pages added as an invisible text
+    layer (render mode 3): the pages look the same but can be searched and
+    their text selected.
+
+    Every line of a page record is written over its box: font size from
+    the box height, stretched horizontally to the box width, in display
+    order (arabic_text.to_display) as PDF text extraction expects. Pages whose
+    record carries no lines (near-duplicates taken from a PageIndex, or OCR
+    run without keep_lines) are left as they are.
+    The copy is saved incrementally, appending only the new objects, every
+    ``save_every`` pages and on close.
+    """
+
+    def __init__(self, source_pdf, output_pdf, save_every=16):
+        import fitz  # PyMuPDF, loaded only when a searchable PDF is written
+
+        self.output_pdf = Path(output_pdf)
+        if Path(source_pdf).resolve() != self.output_pdf.resolve():
+            shutil.copyfile(source_pdf, self.output_pdf)
+        self.doc = fitz.open(self.output_pdf)
+        self.save_every = save_every
+        # Base-14 Helvetica covers Latin text; Arabic comes from MuPDF's Noto
+        self.fonts = {"helv": fitz.Font("helv"), ARABIC_FONT: fitz.Font(script=ARABIC_SCRIPT)}
+        self.pages_without_lines = 0
+        self._unsaved = 0
+        self._arabic_xref = None
+        self._glyphs = {}  # char -> (font name, code, advance)
+
+    def glyphs(self, text):
+        """
+        Split text into (font name, hex string, advance at size 1) runs, each
+        drawn with a font that has its glyphs: Helvetica (WinAnsi codes) for
+        what it can encode, the Arabic font (glyph ids) for the rest
+        """
+        runs = []
+        for char in text:
+            glyph = self._glyphs.get(char)
+            if glyph is None:
+                try:
+                    glyph = ("helv", char.encode("cp1252").hex(), self.fonts["helv"].glyph_advance(ord(char)))
+                except UnicodeEncodeError:
+                    font = self.fonts[ARABIC_FONT]
+                    glyph = (ARABIC_FONT, f"{font.has_glyph(ord(char)):04x}", font.glyph_advance(ord(char)))
+                self._glyphs[char] = glyph
+            name, code, advance = glyph
+            if runs and runs[-1][0] == name:
+                runs[-1][1] += code
+                runs[-1][2] += advance
+            else:
+                runs.append([name, code, advance])
+        return runs
+
+    def add(self, record):
+        lines = record.get("lines")
+        if lines is None:
+            self.pages_without_lines += 1
+            return
+        if not lines:
+            return
+        import fitz
+
+        page = self.doc[record["page"] - 1]
+        page.insert_font(fontname="helv")
+        # The Arabic font is embedded once and shared by every page
+        xref = page.insert_font(fontname=ARABIC_FONT, fontbuffer=self.fonts[ARABIC_FONT].buffer)
+        if xref != self._arabic_xref:
+            fold_to_unicode(self.doc, xref)
+            self._arabic_xref = xref
+        width, height = record["size"]
+        scale_x = page.rect.width / width
+        scale_y = page.rect.height / height
+        # Text operators are written directly, placed in page coordinates
+        # (rotation and crop box included): Shape.insert_text looks up the
+        # page fonts on every call, which costs more than the OCR here
+        to_pdf = ~page.transformation_matrix
+        operators = []
+        for line in lines:
+            runs = self.glyphs(arabic_text.to_display(line["text"].strip()))
+            length = sum(advance for _, _, advance in runs)
+            x0, y0, x1, y1 = line["box"]
+            fontsize = (y1 - y0) * scale_y
+            if not length or fontsize <= 0:
+                continue
+            stretch = (x1 - x0) * scale_x / (length * fontsize)
+            # Baseline a little above the bottom of the box, for descenders
+            x = x0 * scale_x
+            y = y1 * scale_y - 0.2 * fontsize
+            for name, code, advance in runs:
+                matrix = fitz.Matrix(stretch * fontsize, 0, 0, -fontsize, x, y) * to_pdf
+                operators.append(f"/{name} 1 Tf {' '.join(f'{v:g}' for v in matrix)} Tm <{code}> Tj")
+                x += advance * fontsize * stretch
+        if operators:
+            page.wrap_contents()
+            content = self.doc.get_new_xref()
+            self.doc.update_object(content, "<<>>")
+            self.doc.update_stream(content, ("q BT 3 Tr\n" + "\n".join(operators) + "\nET Q").encode())
+            contents = page.get_contents() + [content]
+            self.doc.xref_set_key(page.xref, "Contents", f"[{' '.join(f'{x} 0 R' for x in contents)}]")
+        self._unsaved += 1
+        if self._unsaved >= self.save_every:
+            self.save()
+
+    def save(self):
+        import fitz
+
+        if self.doc.can_save_incrementally():
+            self.doc.saveIncr()
+        else:
+            # Repaired (damaged) files can't be appended to: rewrite once
+            tmp = self.output_pdf.with_name(self.output_pdf.name + ".tmp")
+            self.doc.save(tmp)
+            self.doc.close()
+            os.replace(tmp, self.output_pdf)
+            self.doc = fitz.open(self.output_pdf)
+        self._unsaved = 0
+
+    def close(self):
+        if self._unsaved:
+            self.save()
+        self.doc.close()
+        if self.pages_without_lines:
+            print(f"{self.pages_without_lines} page(s) without text lines left out of {self.output_pdf}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,67 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class PageRing:
+    """
+    Fixed set of page buffers in one shared memory block.
+
+    The process rendering the pages copies each one into a free slot with
+    ``put`` and sends the small descriptor it returns to a worker, which
+    reads the pixels in place with ``page_view``; no pixels go through a
+    pipe or a file. A slot is handed out again only after ``release``, once
+    the worker is done with the page, so memory stays at ``slots *
+    slot_bytes`` however long the document is.
+    """
+
+    def __init__(self, slots, slot_bytes):
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.shm = shared_memory.SharedMemory(create=True, size=slots * slot_bytes)
+        self._free = list(range(slots))
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def has_free(self):
+        return bool(self._free)
+
+    def put(self, image):
+        """Copy a page into a free slot; returns (slot, offset, shape, dtype) for page_view"""
+        image = np.asarray(image)
+        if image.nbytes > self.slot_bytes:
+            raise ValueError(f"Page of {image.nbytes} bytes does not fit a {self.slot_bytes} byte slot")
+        slot = self._free.pop()
+        page = (slot, slot * self.slot_bytes, image.shape, image.dtype.str)
+        page_view(self.shm, page)[...] = image
+        return page
+
+    def release(self, page):
+        self._free.append(page[0])
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def attach(name):
+    """Open a PageRing's memory from a worker process"""
+    # Workers share their parent's resource tracker, so the block is
+    # unlinked once, by the PageRing that created it
+    return shared_memory.SharedMemory(name=name)
+
+
+def page_view(shm, page):
+    """numpy view of the page described by ``page`` (from PageRing.put), without copying"""
+    _, offset, shape, dtype = page
+    dtype = np.dtype(dtype)
+    count = int(np.prod(shape))
+    return np.frombuffer(shm.buf, dtype=dtype, count=count, offset=offset).reshape(shape)
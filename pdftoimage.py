@@ -1,8 +1,11 @@
 # pip install pymupdf
-import fitz  # PyMuPDF
+import math
+import numpy as np
 from pathlib import Path
 from typing import Iterable, Optional
-from tqdm import tqdm
+
+# fitz (PyMuPDF) and tqdm are imported where they are used, so that
+# importing this module (and ocr.py) stays cheap for image-folder runs
 
 def convert_pdf_to_images(
     pdf_path: str,
@@ -12,6 +15,9 @@ def convert_pdf_to_images(
     pages: Optional[Iterable[int]] = None,  # 0-based page indices; None = all
     prefix: Optional[str] = None,
 ):
+    import fitz  # PyMuPDF
+    from tqdm import tqdm
+
     pdf_path = Path(pdf_path)
     out_dir = Path(out_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
@@ -38,6 +44,70 @@ def convert_pdf_to_images(
     finally:
         doc.close()
 
+def pdf_page_count(pdf_path: str) -> int:
+    import fitz  # PyMuPDF
+
+    doc = fitz.open(Path(pdf_path))
+    try:
+        return len(doc)
+    finally:
+        doc.close()
+
+def max_page_bytes(
+    pdf_path: str,
+    dpi: int = 200,
+    pages: Optional[Iterable[int]] = None,
+) -> int:
+    """Size of the largest grayscale page iter_pdf_pages would render, without rendering it."""
+    import fitz  # PyMuPDF
+
+    doc = fitz.open(Path(pdf_path))
+    try:
+        zoom = dpi / 72.0
+        page_indices = pages if pages is not None else range(len(doc))
+        largest = 0
+        for i in page_indices:
+            rect = doc.load_page(i).rect
+            # +1: the pixmap's integer bounding box may round up on both sides
+            largest = max(largest, (math.ceil(rect.width * zoom) + 1) * (math.ceil(rect.height * zoom) + 1))
+        return largest
+    finally:
+        doc.close()
+
+def pixmap_to_array(pix):
+    """Wrap the pixmap samples in a numpy array without copying them."""
+    samples = np.frombuffer(pix.samples_mv, dtype=np.uint8)
+    rows = samples.reshape(pix.height, pix.stride)[:, : pix.width * pix.n]
+    if pix.n == 1:
+        return rows
+    return rows.reshape(pix.height, pix.width, pix.n)
+
+def iter_pdf_pages(
+    pdf_path: str,
+    dpi: int = 200,
+    pages: Optional[Iterable[int]] = None,  # 0-based page indices; None = all
+):
+    """
+    Render PDF pages one by one and yield (page_index, image) pairs.
+
+    Nothing is written to disk: ``image`` is a grayscale numpy view over the
+    pixmap samples, valid until the next page is requested.
+    """
+    import fitz  # PyMuPDF
+
+    doc = fitz.open(Path(pdf_path))
+    try:
+        zoom = dpi / 72.0
+        mat = fitz.Matrix(zoom, zoom)
+
+        page_indices = pages if pages is not None else range(len(doc))
+        for i in page_indices:
+            page = doc.load_page(i)
+            pix = page.get_pixmap(matrix=mat, alpha=False, colorspace=fitz.csGRAY)
+            yield i, pixmap_to_array(pix)
+    finally:
+        doc.close()
+
 if __name__ == "__main__":
     # Example usage
     # python script.py  (when run directly)
@@ -0,0 +1,134 @@
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+
+def to_gray(image):
+    """Convert a PIL image or numpy array to a single-channel numpy array"""
+    img = np.asarray(image)
+    if img.ndim == 3:
+        # PIL gives RGB(A); OpenCV's conversion only needs the channel count
+        code = cv2.COLOR_RGBA2GRAY if img.shape[2] == 4 else cv2.COLOR_RGB2GRAY
+        return cv2.cvtColor(img, code)
+    return img
+
+
+def crop(img, top=0.0, bottom=0.095):
+    """
+    Cut the given fractions of the page height from the top and the bottom.
+
+    The default drops the footer band (150 px of a page rendered at 200 dpi);
+    ArabicPDFOCR replaces it with the bands found by layout.detect_repeated_bands.
+    """
+    start, stop = crop_rows(img.shape[0], top, bottom)
+    return img[start:stop, :]
+
+
+def crop_rows(height, top=0.0, bottom=0.095):
+    """First and last (exclusive) page rows kept by crop"""
+    start = int(round(height * top))
+    stop = height - int(round(height * bottom))
+    if start >= stop:
+        return 0, height
+    return start, stop
+
+
+def remove_watermark(img, threshold=127):
+    """Binary threshold that drops light grey watermark/background text"""
+    _, mask = cv2.threshold(img, threshold, 255, cv2.THRESH_BINARY)
+    return mask
+
+
+def denoise(img, h=3, template_window=7, search_window=21):
+    return cv2.fastNlMeansDenoising(img, None, h, template_window, search_window)
+
+
+def otsu_threshold(img):
+    _, thresh = cv2.threshold(img, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return thresh
+
+
+def morph_close(img, kernel=(1, 1)):
+    element = cv2.getStructuringElement(cv2.MORPH_RECT, tuple(kernel))
+    return cv2.morphologyEx(img, cv2.MORPH_CLOSE, element)
+
+
+# name: (input stage, function, default parameters); None = the grayscale page
+STAGES = {
+    "crop": (None, crop, {"top": 0.0, "bottom": 0.095}),
+    "watermark": ("crop", remove_watermark, {"threshold": 127}),
+    "denoise": ("watermark", denoise, {"h": 3, "template_window": 7, "search_window": 21}),
+    "threshold": ("denoise", otsu_threshold, {}),
+    "morph": ("threshold", morph_close, {"kernel": (1, 1)}),
+}
+
+
+class PreprocessGraph:
+    """
+    Declarative preprocessing: a graph of named stages, evaluated lazily.
+
+    ``params`` maps stage names to parameter overrides, plus ``"output"``
+    for the stage whose image is returned. Only that stage and the stages
+    feeding it are computed. When ``debug_dir`` is set every computed stage
+    is written there as a PNG.
+    """
+
+    def __init__(self, stages=None, output="watermark", debug_dir=None):
+        self.stages = dict(STAGES if stages is None else stages)
+        self.output = output
+        self.debug_dir = debug_dir
+
+    def resolve(self, params=None):
+        """Merge per-run overrides into the defaults: {"output": ..., stage: {...}}"""
+        params = params or {}
+        resolved = {"output": params.get("output", self.output)}
+        for name, (_, _, defaults) in self.stages.items():
+            resolved[name] = {**defaults, **params.get(name, {})}
+        if resolved["output"] not in self.stages:
+            raise ValueError(f"Unknown preprocessing stage: {resolved['output']}")
+        return resolved
+
+    def plan(self, output):
+        """Stages needed to produce ``output``, in execution order"""
+        chain = []
+        name = output
+        while name is not None:
+            chain.append(name)
+            name = self.stages[name][0]
+        return chain[::-1]
+
+    def signature(self, params=None):
+        """Stable description of the stages that run and their parameters"""
+        resolved = self.resolve(params)
+        return " > ".join(
+            f"{name}{sorted(resolved[name].items())}" for name in self.plan(resolved["output"])
+        )
+
+    def run(self, image, params=None, debug_name="page", timer=None, results=None):
+        """
+        Compute the output stage; ``timer(name, seconds)`` is called after each stage.
+
+        ``results`` is a dict that keeps every stage image computed, so a
+        later run on the same page with the same parameters (up to another
+        output stage) starts from there instead of from the page.
+        """
+        resolved = self.resolve(params)
+        if results is None:
+            results = {}
+        if None not in results:
+            results[None] = to_gray(image)
+        for name in self.plan(resolved["output"]):
+            if name in results:
+                continue
+            source, function, _ = self.stages[name]
+            start = time.perf_counter()
+            results[name] = function(results[source], **resolved[name])
+            if timer is not None:
+                timer(name, time.perf_counter() - start)
+            if self.debug_dir:
+                out_dir = Path(self.debug_dir)
+                out_dir.mkdir(parents=True, exist_ok=True)
+                cv2.imwrite(str(out_dir / f"{debug_name}_{name}.png"), results[name])
+        return results[resolved["output"]]
@@ -0,0 +1,84 @@
+import unicodedata
+
+from arabic_text import TASHKEEL
+
+# Punctuation and symbols that legitimately appear in the legal texts
+EXPECTED_PUNCTUATION = set(".,:;!?()[]-–—\"'«»/%*°§")
+
+
+def is_expected_char(char):
+    """Characters OCR output of Arabic/French text is made of"""
+    code = ord(char)
+    if 0x0600 <= code <= 0x06FF or 0xFB50 <= code <= 0xFEFF:  # Arabic + presentation forms
+        return True
+    if char.isalnum():  # Latin letters incl. French accents, digits
+        return unicodedata.category(char)[0] in "LN"
+    return char in EXPECTED_PUNCTUATION
+
+
+def sanity_score(text):
+    """Fraction of non-space characters that look like real text (1.0 for empty text)"""
+    chars = [char for char in text if not char.isspace()]
+    if not chars:
+        return 1.0
+    return sum(1 for char in chars if is_expected_char(char)) / len(chars)
+
+
+def fragmentation(text):
+    """Fraction of single-character words: high when OCR shatters a line into noise"""
+    words = text.split()
+    if not words:
+        return 0.0
+    return sum(1 for word in words if len(word) == 1) / len(words)
+
+
+def page_passes(text, confidence=None, has_ink=False, min_confidence=70, min_sanity=0.9,
+                max_fragmentation=0.5):
+    """
+    Decide whether a page's OCR result is good enough or should be redone.
+
+    Returns (passed, reason). ``confidence`` is 0-100 or None when unknown;
+    ``has_ink`` marks pages with visible text, where empty output is a failure.
+    """
+    if not text.strip():
+        return (False, "no text on a page with ink") if has_ink else (True, "blank")
+    if confidence is not None and confidence < min_confidence:
+        return False, f"confidence {confidence:.0f} < {min_confidence}"
+    score = sanity_score(text)
+    if score < min_sanity:
+        return False, f"sanity {score:.2f} < {min_sanity}"
+    if fragmentation(text) > max_fragmentation:
+        return False, "fragmented text"
+    return True, "ok"
+
+
+def normalize_for_cer(text):
+    """NFKC, drop tatweel/diacritics and collapse whitespace before comparing"""
+    text = unicodedata.normalize("NFKC", text).translate(TASHKEEL)
+    return " ".join(text.split())
+
+
+def edit_distance(a, b):
+    """Levenshtein distance between two strings"""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b),
+            ))
+        previous = current
+    return previous[-1]
+
+
+def character_error_rate(hypothesis, reference):
+    """Edit distance over reference length, after normalize_for_cer"""
+    hypothesis = normalize_for_cer(hypothesis)
+    reference = normalize_for_cer(reference)
+    if not reference:
+        return 0.0 if not hypothesis else 1.0
+    return edit_distance(hypothesis, reference) / len(reference)
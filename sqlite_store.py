@@ -0,0 +1,65 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class SQLiteStore:
+    """
+    Base of the SQLite-backed stores (OCRCache, PageIndex).
+
+    ``path`` is a file opened in WAL mode, so several worker processes can
+    read and write it at once, or None for an in-memory database (one per
+    connection, so for one process and one thread only). Instances can be
+    pickled to pool workers and shared by threads (the OCRServer engines):
+    every process and thread opens its own connection on first use, and
+    runs the subclass's ``SCHEMA`` statements on it.
+    """
+
+    SCHEMA = ()
+
+    def __init__(self, path):
+        self.path = path
+        self._conns = {}  # (pid, thread id) -> connection
+
+    def __getstate__(self):
+        # Connections can't cross process boundaries; workers reopen lazily
+        state = self.__dict__.copy()
+        state["_conns"] = {}
+        return state
+
+    def _connect(self):
+        # sqlite3 connections belong to the thread that opened them
+        owner = (os.getpid(), threading.get_ident())
+        conn = self._conns.get(owner)
+        if conn is None:
+            if any(pid != owner[0] for pid, _ in self._conns):
+                # Forked: the parent's connections are not ours to use
+                self._conns = {}
+            if self.path is None:
+                conn = sqlite3.connect(":memory:", isolation_level=None)
+            else:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+            self._conns[owner] = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """
+        Write transaction on this thread's connection. BEGIN IMMEDIATE takes
+        the write lock up front so that concurrent writers queue on it
+        instead of failing half way through.
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
@@ -0,0 +1,229 @@
+import importlib.util
+import multiprocessing
+import queue
+import shlex
+
+import numpy as np
+
+
+def parse_tesseract_config(config):
+    """
+    Split a pytesseract-style config string into tesserocr arguments.
+
+    Supports ``-l``, ``--oem``, ``--psm``, ``--tessdata-dir`` and ``-c name=value``.
+    """
+    options = {"lang": "eng", "oem": 3, "psm": 3, "path": None, "variables": {}}
+    args = shlex.split(config)
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        value = args[i + 1] if i + 1 < len(args) else None
+        if arg == "-l":
+            options["lang"] = value
+        elif arg == "--oem":
+            options["oem"] = int(value)
+        elif arg == "--psm":
+            options["psm"] = int(value)
+        elif arg == "--tessdata-dir":
+            options["path"] = value
+        elif arg == "-c":
+            name, _, var = value.partition("=")
+            options["variables"][name] = var
+        else:
+            raise ValueError(f"Unsupported tesseract option: {arg}")
+        i += 2
+    return options
+
+
+def _tesseract_worker(conn, config):
+    """Worker loop: load the models once, then OCR every image sent over the pipe"""
+    try:
+        import tesserocr
+
+        options = parse_tesseract_config(config)
+        kwargs = {
+            "lang": options["lang"],
+            "oem": tesserocr.OEM(options["oem"]),
+            "psm": tesserocr.PSM(options["psm"]),
+        }
+        if options["path"]:
+            kwargs["path"] = options["path"]
+        api = tesserocr.PyTessBaseAPI(**kwargs)
+        for name, value in options["variables"].items():
+            api.SetVariable(name, value)
+    except Exception as e:
+        conn.send(("error", f"{type(e).__name__}: {e}"))
+        return
+    conn.send(("ready", None))
+
+    with api:
+        while True:
+            try:
+                header = conn.recv()
+            except EOFError:
+                return
+            if header is None:
+                return
+            op, height, width, channels = header
+            pixels = conn.recv_bytes()
+            try:
+                api.SetImageBytes(pixels, width, height, channels, width * channels)
+                if op == "lines":
+                    conn.send(("ok", _recognized_lines(api, tesserocr)))
+                else:
+                    conn.send(("ok", api.GetUTF8Text()))
+            except Exception as e:
+                conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+def _recognized_lines(api, tesserocr):
+    """Text lines with their confidence (0-100) and (x0, y0, x1, y1) box"""
+    api.Recognize()
+    level = tesserocr.RIL.TEXTLINE
+    lines = []
+    for line in tesserocr.iterate_level(api.GetIterator(), level):
+        text = line.GetUTF8Text(level)
+        if text and text.strip():
+            lines.append({
+                "text": text.strip(),
+                "confidence": line.Confidence(level),
+                "box": line.BoundingBox(level),
+            })
+    return lines
+
+
+class _Worker:
+    def __init__(self, context, config, startup_timeout):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_tesseract_worker, args=(child_conn, config), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        if not self.conn.poll(startup_timeout):
+            self.kill()
+            raise TimeoutError("Tesseract worker did not start in time")
+        status, message = self.conn.recv()
+        if status != "ready":
+            self.kill()
+            raise RuntimeError(f"Tesseract worker failed to start: {message}")
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class TesseractPool:
+    """
+    Pool of long-lived Tesseract processes.
+
+    Each worker loads the traineddata for ``config`` once (through tesserocr,
+    the libtesseract binding) and then receives raw pixels over a pipe, so
+    there is no process spawn, temp file or model reload per image. Requests
+    that exceed ``timeout`` seconds kill their worker; dead or timed-out
+    workers are replaced automatically. Safe to share between threads.
+    """
+
+    def __init__(self, size=2, config=r'--oem 3 --psm 6 -l ara+fra', timeout=120, startup_timeout=60):
+        if importlib.util.find_spec("tesserocr") is None:
+            raise ImportError("TesseractPool needs tesserocr: pip install tesserocr")
+        self.config = config
+        self.timeout = timeout
+        self.startup_timeout = startup_timeout
+        # spawn: workers must not inherit torch/OpenCV state from the parent
+        self._context = multiprocessing.get_context("spawn")
+        self._idle = queue.Queue()
+        self._workers = []
+        # Why the last worker was lost when none could be restarted
+        self._broken = None
+        for _ in range(size):
+            self._add_worker()
+
+    def _add_worker(self):
+        worker = _Worker(self._context, self.config, self.startup_timeout)
+        self._workers.append(worker)
+        self._idle.put(worker)
+
+    def _replace(self, worker, attempts=2):
+        """Swap a dead or stuck worker for a new one; without any worker left, the pool is broken"""
+        worker.kill()
+        self._workers.remove(worker)
+        for attempt in range(attempts):
+            try:
+                self._add_worker()
+                return
+            except (TimeoutError, RuntimeError, OSError) as e:
+                print(f"Tesseract worker restart failed ({attempt + 1}/{attempts}): {e}")
+                error = e
+        if not self._workers:
+            self._broken = error
+            # Wakes up every thread waiting for an idle worker
+            self._idle.put(None)
+
+    def _run(self, worker, op, image, timeout):
+        height, width = image.shape[:2]
+        channels = 1 if image.ndim == 2 else image.shape[2]
+        worker.conn.send((op, height, width, channels))
+        worker.conn.send_bytes(memoryview(image).cast("B"))
+        if not worker.conn.poll(timeout):
+            raise TimeoutError(f"Tesseract took longer than {timeout}s")
+        status, payload = worker.conn.recv()
+        if status != "ok":
+            raise RuntimeError(payload)
+        return payload
+
+    def image_to_string(self, image, timeout=None):
+        """OCR one image (PIL or numpy, grayscale or RGB) on the next idle worker"""
+        return self._submit("text", image, timeout)
+
+    def image_to_lines(self, image, timeout=None):
+        """
+        OCR one image and return its text lines as dicts with "text",
+        "confidence" (0-100) and "box" (x0, y0, x1, y1)
+        """
+        return self._submit("lines", image, timeout)
+
+    def _submit(self, op, image, timeout):
+        image = np.ascontiguousarray(np.asarray(image), dtype=np.uint8)
+        timeout = self.timeout if timeout is None else timeout
+
+        # A crashed worker is replaced and the image retried once
+        for attempt in range(2):
+            worker = self._idle.get()
+            if worker is None:
+                self._idle.put(None)
+                raise RuntimeError(f"Tesseract pool has no worker left: {self._broken}")
+            try:
+                result = self._run(worker, op, image, timeout)
+            except TimeoutError:
+                self._replace(worker)
+                raise
+            except (EOFError, BrokenPipeError, ConnectionResetError):
+                self._replace(worker)
+                if attempt:
+                    raise RuntimeError("Tesseract worker crashed twice on the same image")
+                continue
+            except Exception:
+                # Tesseract reported an error; the worker itself is fine
+                self._idle.put(worker)
+                raise
+            self._idle.put(worker)
+            return result
+
+    def close(self):
+        for worker in self._workers:
+            try:
+                worker.conn.send(None)
+            except (OSError, BrokenPipeError):
+                pass
+            worker.process.join(timeout=5)
+            worker.kill()
+        self._workers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
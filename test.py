@@ -1,19 +1,24 @@
 import cv2
+from pathlib import Path
+
+from layout import detect_repeated_bands
+from preprocess import crop
 def remove_watermark(path: str):
     img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
     # Ignore light gray (watermark), keep dark text
     _, mask = cv2.threshold(img, 127, 255, cv2.THRESH_BINARY)
     return mask
-def resize_from_bottom(img, new_height):
+def crop_repeated_bands(img, folder="COCArabe"):
+    # Headers/footers are found across the document, not cut at a fixed 150px
+    pages = sorted(Path(folder).glob("*.png"))[::15]
+    margins = detect_repeated_bands([cv2.imread(str(p), cv2.IMREAD_GRAYSCALE) for p in pages])
     img = cv2.imread(img, cv2.IMREAD_GRAYSCALE)
     h, w = img.shape[:2]
-    print(h,w)
-    if new_height >= h:
-        return img  
-    return img[:h - new_height, :]
+    print(h,w,margins)
+    return crop(img, **margins)
 cv2.imwrite("cleaned2s.png", remove_watermark("COCArabe/COCArabe_page-017.png"))
 
-cv2.imwrite("cleaned2.png", resize_from_bottom("COCArabe/COCArabe_page-017.png", 150))
+cv2.imwrite("cleaned2.png", crop_repeated_bands("COCArabe/COCArabe_page-017.png"))
 
 cv2.waitKey(0)
-cv2.destroyAllWindows()
\ No newline at end of file
+cv2.destroyAllWindows()
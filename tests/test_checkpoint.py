@@ -0,0 +1,126 @@
+import json
+
+import fitz  # PyMuPDF
+import numpy as np
+import pytest
+import pytesseract
+
+from checkpoint import CheckpointedOutput
+from ocr import ArabicPDFOCR
+
+
+class FakeHasher:
+    """Input hash of each page from a dict, so tests can change a page"""
+
+    def __init__(self, hashes):
+        self.hashes = hashes
+
+    def __call__(self, index):
+        return self.hashes[index]
+
+    def close(self):
+        pass
+
+
+CONFIG = {"source": "doc.pdf", "signature": "tesseract", "dpi": 200}
+
+
+def write_pages(output_file, hasher, pages, texts, resume=True):
+    with CheckpointedOutput(output_file, range(len(texts)), hasher, CONFIG, resume=resume) as output:
+        remaining = list(output.remaining)
+        for index in pages:
+            if index in remaining:
+                output.add(index, texts[index])
+        return remaining
+
+
+def expected(texts):
+    return "\n".join(f"--- Page {i + 1} ---\n{text}\n" for i, text in enumerate(texts) if text.strip())
+
+
+def test_out_of_order_pages_are_written_in_order(tmp_path):
+    output_file = tmp_path / "out.txt"
+    texts = ["un", "", "trois", "quatre"]
+    write_pages(output_file, FakeHasher(dict.fromkeys(range(4), "h")), [2, 0, 3, 1], texts)
+    assert output_file.read_text(encoding="utf-8") == expected(texts)
+
+
+def test_resume_after_a_torn_manifest_line(tmp_path):
+    output_file = tmp_path / "out.txt"
+    texts = ["un", "deux", "trois", "quatre"]
+    hasher = FakeHasher(dict.fromkeys(range(4), "h"))
+    write_pages(output_file, hasher, [0, 1, 2], texts)
+    manifest = tmp_path / "out.txt.manifest.jsonl"
+    lines = manifest.read_text(encoding="utf-8").splitlines(keepends=True)
+    # Crash while writing the entry of page 3 (index 2)
+    manifest.write_text("".join(lines[:-1]) + lines[-1][:10], encoding="utf-8")
+
+    assert write_pages(output_file, hasher, range(4), texts) == [2, 3]
+    assert output_file.read_text(encoding="utf-8") == expected(texts)
+
+
+def test_resume_restarts_at_a_changed_page(tmp_path):
+    output_file = tmp_path / "out.txt"
+    texts = ["un", "deux", "trois"]
+    hashes = dict.fromkeys(range(3), "h")
+    write_pages(output_file, FakeHasher(hashes), [0, 1, 2], texts)
+    hashes[1] = "changed"
+    texts[1] = "deux bis"
+
+    assert write_pages(output_file, FakeHasher(hashes), range(3), texts) == [1, 2]
+    assert output_file.read_text(encoding="utf-8") == expected(texts)
+
+
+def test_other_config_starts_over(tmp_path):
+    output_file = tmp_path / "out.txt"
+    hasher = FakeHasher(dict.fromkeys(range(2), "h"))
+    write_pages(output_file, hasher, [0, 1], ["un", "deux"])
+    manifest = tmp_path / "out.txt.manifest.jsonl"
+    lines = manifest.read_text(encoding="utf-8").splitlines()
+    lines[0] = json.dumps({"config": {**CONFIG, "dpi": 300}})
+    manifest.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    assert write_pages(output_file, hasher, [0, 1], ["un", "deux"]) == [0, 1]
+
+
+class Interrupted(KeyboardInterrupt):
+    """Stops the run like Ctrl+C: engine errors are caught, this is not"""
+
+
+def footer_document(path):
+    """Six pages of text; only the first four carry the running footer"""
+    doc = fitz.open()
+    for i in range(6):
+        page = doc.new_page(width=400, height=600)
+        for line in range(10):
+            page.insert_text((40, 60 + 30 * line), f"Body text {i} line {line} " + "x" * (i + line), fontsize=14)
+        if i < 4:
+            page.insert_text((150, 580), "Official journal", fontsize=12)
+    doc.save(path)
+
+
+def test_resumed_ocr_pdf_keeps_the_document_crop(tmp_path, monkeypatch):
+    source = tmp_path / "doc.pdf"
+    footer_document(source)
+    calls = []
+    fail_at = 0
+
+    def image_size(image, config=None):
+        calls.append(1)
+        if len(calls) == fail_at:
+            raise Interrupted
+        height, width = np.asarray(image).shape[:2]
+        return f"{width}x{height}"
+
+    monkeypatch.setattr(pytesseract, "image_to_string", image_size)
+    ocr = ArabicPDFOCR(use_easyocr=False, skip_blank=False)
+    whole = ocr.ocr_pdf(str(source), output_file=tmp_path / "whole.txt", dpi=72)
+
+    calls.clear()
+    fail_at = 4  # interrupted on page 4 of 6
+    with pytest.raises(Interrupted):
+        ocr.ocr_pdf(str(source), output_file=tmp_path / "resumed.txt", dpi=72)
+    calls.clear()
+    fail_at = 0
+    assert ocr.ocr_pdf(str(source), output_file=tmp_path / "resumed.txt", dpi=72) == whole
+    assert len(calls) == 3  # pages 4-6 only
@@ -0,0 +1,29 @@
+import threading
+
+import numpy as np
+
+from ocr_cache import OCRCache
+
+
+def test_cache_shared_by_threads(tmp_path):
+    cache = OCRCache(tmp_path / "cache.sqlite")
+    page = np.zeros((8, 8), dtype=np.uint8)
+    key = cache.key(page, "tesseract")
+    cache.put(key, "نص")
+    results, errors = [], []
+
+    def engine():
+        try:
+            results.append(cache.get(key))
+            cache.put(cache.key(page, threading.current_thread().name), "text")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=engine, name=f"engine-{i}") for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert results == ["نص"] * 4
+    assert cache.get(cache.key(page, "engine-3")) == "text"
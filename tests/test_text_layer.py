@@ -0,0 +1,51 @@
+from PyPDF2 import PageObject, PdfWriter
+from PyPDF2.generic import (ArrayObject, DecodedStreamObject, DictionaryObject, NameObject,
+                            NumberObject)
+
+from main import extract_text_layer, font_glyph_table
+
+
+def differences_font():
+    """Type1 font whose codes 65-67 are named Arabic glyphs, as in COCArabe.pdf"""
+    encoding = DictionaryObject({
+        NameObject("/Type"): NameObject("/Encoding"),
+        NameObject("/Differences"): ArrayObject([
+            NumberObject(65), NameObject("/laminitial"), NameObject("/aleffinal"),
+            NameObject("/uni0645"),
+        ]),
+    })
+    return DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/ArabicGlyphs"),
+        NameObject("/Encoding"): encoding,
+    })
+
+
+def test_font_glyph_table_reads_differences():
+    code_bytes, table = font_glyph_table(differences_font())
+    assert code_bytes == 1
+    assert table[65] == "ل"
+    assert table[66] == "ا"
+    assert table[67] == "م"
+    assert table[ord("x")] == "x"  # StandardEncoding below the differences
+
+
+def test_extract_text_layer_decodes_content_stream(tmp_path):
+    writer = PdfWriter()
+    page = PageObject.create_blank_page(width=200, height=200)
+    page[NameObject("/Resources")] = DictionaryObject({
+        NameObject("/Font"): DictionaryObject({NameObject("/F1"): writer._add_object(differences_font())}),
+    })
+    content = DecodedStreamObject()
+    content.set_data(
+        b"BT /F1 12 Tf 10 150 Td (AB) Tj 0 -20 Td [(C) -250 (\\101)] TJ ET\n"
+        b"BT /F1 12 Tf 1 0 0 1 10 100 Tm <4142> Tj ET"
+    )
+    page[NameObject("/Contents")] = writer._add_object(content)
+    writer.add_page(page)
+    path = tmp_path / "differences.pdf"
+    with open(path, "wb") as f:
+        writer.write(f)
+
+    assert extract_text_layer(str(path), workers=1) == ["لا\nمل\nلا"]